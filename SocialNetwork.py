@@ -7,9 +7,10 @@ closely intertwined with the underlying models as possible.
 '''
 import networkx as nx
 import numpy as np
-import random
+import heapq
 
 from copy import deepcopy
+from scipy import sparse
 from warnings import warn
 
 from helpers import *
@@ -98,7 +99,16 @@ PROPSELECT = {# used in initial setup of graph structure
               'num_nodes_connect': POSNUM,
               'num_nodes_disconnect': POSNUM,
               'num_connections': POSNUM,
-              'num_disconnections': POSNUM
+              'num_disconnections': POSNUM,
+              'q': POSNUM,                    # number of neighbors that must agree under the 'qvoter' update method
+              'timing': ['discrete', 'continuous'],  # how the 'transmission' update method advances time
+              'update_order': ['sync', 'async', 'block'],  # in what order update() changes states; see update()
+              'connect_candidates': ['all', 'two_hop', 'mixed'],  # whom get_connections() considers; see
+                                                                  # get_connection_candidates()
+              'global_candidates': PROB,      # under 'mixed', how many random nodes join the two-hop candidates,
+                                              # as a fraction of their number
+              'connect_budget': POSINT,       # how many nodes get_connections() scores per node, as a multiple of
+                                              # num_connections; 0 scores them all.  See sample_connection_candidates()
               }
 
 PROPDEFAULTS = {'n': 0,
@@ -155,6 +165,13 @@ PROPDEFAULTS = {'n': 0,
                 'thresh_connect': 0,
                 'thresh_disconnect': 1,
                 'update_method': 'average',
+                'q': 2,
+                'timing': 'discrete',
+                'update_order': 'sync',
+                'connect_candidates': 'all',
+                'global_candidates': .1,
+                'connect_budget': 0,
+                'seed': None,
                 }
 
 class SocialNetwork:
@@ -171,6 +188,8 @@ class SocialNetwork:
         - 'multiedge': bool - - - whether multiedges are allowed or not
         - 'selfloops': bool - - - whether selfloops are present
         - 'symmetric': bool - - - whether edge symmetry is enforced or not
+        - 'seed': int - - - seed for the network's random number generator, self.rng; every random draw the network
+                            makes comes from it, so equal seeds give equal runs
 
 
         * List of common NetworkX methods that can be used on SocialNetwork instances: *
@@ -204,11 +223,8 @@ class SocialNetwork:
         self._generate_nodes()
         self._init_diffusion_space()
         self._init_masks()
+        self._init_normalized_weights()
         self._generate_edges()
-        if self.prop('normalize'):
-            self.prop(normalized_weights={i: {} for i in self.nodes()})
-        for i in range(self.number_of_nodes()):
-            self._update_normalized_edge_weights(i)
         self._init_certainty()
         self._init_confidence()
         self._init_resistance()
@@ -224,7 +240,9 @@ class SocialNetwork:
         :param name: name of method or attribute
         :return: the return value of the underlying method or attribute
         '''
-        return self.instance.__getattribute__(name)
+        if name == 'instance':
+            raise AttributeError(name)
+        return getattr(self.instance, name)
 
     def __getitem__(self, name):
         '''
@@ -268,6 +286,29 @@ class SocialNetwork:
         :return: None
         '''
 
+        # Any change to the edge set bumps the topology version, invalidating cached adjacency arrays.  The endpoints
+        # of changed edges are collected in self._touched until update() clears it.
+        self.topology_version = 0
+        self._adjacency = None
+        self._touched = set()
+
+        # Nodes known to keep their state under the update method, and what they were checked against
+        self._settled = None
+        self._settled_since = None
+
+        # How much the last step changed the network
+        self.diagnostics = {'max_delta': 0., 'num_changed': 0, 'num_rewired': 0}
+
+        # Compiled form of the 'transmission_probs' property, built on first use.
+        self._transmission = None
+
+        # Event queue and clock for continuous-time transmission, built on first use.
+        self._events = None
+        self.clock = 0.
+
+        # All randomness comes from this generator.
+        self.rng = np.random.default_rng(kwargs['seed'])
+
         # Set up base class depending on input parameters
         dir, mult = kwargs['directed'], kwargs['multiedge']
         if not dir and not mult:
@@ -285,6 +326,123 @@ class SocialNetwork:
         else:
             raise AttributeError('Encountered a problem while creating graph instance.  Aborting.')
 
+    def add_edge(self, u, v, *args, **kwargs):
+        '''
+        Add an edge to the underlying graph and mark the topology as changed.
+
+        :return: the return value of the underlying add_edge()
+        '''
+        self.topology_version += 1
+        self._touched.update([u, v])
+        return self.instance.add_edge(u, v, *args, **kwargs)
+
+    def add_edges_from(self, ebunch, **kwargs):
+        '''
+        Add edges to the underlying graph and mark the topology as changed.
+
+        :return: the return value of the underlying add_edges_from()
+        '''
+        ebunch = list(ebunch)
+        self.topology_version += 1
+        self._touched.update([e[0] for e in ebunch] + [e[1] for e in ebunch])
+        return self.instance.add_edges_from(ebunch, **kwargs)
+
+    def remove_edge(self, u, v, *args):
+        '''
+        Remove an edge from the underlying graph and mark the topology as changed.
+
+        :return: None
+        '''
+        self.topology_version += 1
+        self._touched.update([u, v])
+        self.instance.remove_edge(u, v, *args)
+
+    def remove_edges_from(self, ebunch):
+        '''
+        Remove edges from the underlying graph and mark the topology as changed.
+
+        :return: None
+        '''
+        ebunch = list(ebunch)
+        self.topology_version += 1
+        self._touched.update([e[0] for e in ebunch] + [e[1] for e in ebunch])
+        self.instance.remove_edges_from(ebunch)
+
+    def get_adjacency(self, inbound=False):
+        '''
+        Return a sparse snapshot of the graph's adjacency, indexed by state matrix rows, so that A[i, j] == 1 if
+        there is an edge from node_list[i] to node_list[j].  Parallel edges are collapsed into one entry.
+        The snapshot is built on first use and reused until the topology version changes.
+
+        :param inbound: if True, return the snapshot in CSC form, so that the indices of column j are the rows of
+                        node_list[j]'s in-neighbors (its predecessors in directed graphs)
+        :return: a scipy.sparse csr_matrix, or csc_matrix if param:inbound is True
+        '''
+        if not self._adjacency_is_current():
+            n = len(self.node_list)
+            edges = [(self.node_index[u], self.node_index[v]) for u, v in self.instance.edges()]
+            edges = np.array(edges, dtype=np.intp).reshape(-1, 2)
+            if not self.settings.directed:
+                back = edges[edges[:, 0] != edges[:, 1]]
+                edges = np.concatenate([edges, back[:, ::-1]])
+            csr = sparse.csr_matrix((np.ones(len(edges)), (edges[:, 0], edges[:, 1])), shape=(n, n))
+            csr.sum_duplicates()
+            csr.data[:] = 1.
+            csc = csr.tocsc()
+
+            # Entry (i, j) of the CSC form gets the sort key j * n + i, so that single entries can be found by bisection.
+            keys = np.repeat(np.arange(n, dtype=np.int64), np.diff(csc.indptr)) * n + csc.indices
+            self._adjacency = {'version': self.topology_version, 'csr': csr, 'csc': csc, 'keys': keys, 'slots': None,
+                               'colors': None}
+        return self._adjacency['csc' if inbound else 'csr']
+
+    def _adjacency_is_current(self):
+        '''
+        Checks whether the cached adjacency snapshot reflects the current topology.
+
+        :return: True if the snapshot can be reused, False otherwise
+        '''
+        return self._adjacency is not None and self._adjacency['version'] == self.topology_version
+
+    def get_influence_slots(self):
+        '''
+        Return the mask slot of every entry of the inbound adjacency snapshot, i.e. for the entry at position p of
+        column j, the slot holding node_list[j]'s view of node_list[indices[p]].  Self-edges of nodes without
+        a self-mask get slot -1.
+        The snapshot's entry keys and the mask store's pair keys share the same form, so the slots are found with
+        one bisection of the one into the other.
+
+        :return: an integer array aligned with get_adjacency(inbound=True).indices
+        '''
+        self.get_adjacency(inbound=True)
+        if self._adjacency['slots'] is None:
+            keys = self._adjacency['keys']
+            mask_keys, mask_slots = self.mask_store.pair_keys(len(self.node_list))
+            pos = np.minimum(np.searchsorted(mask_keys, keys), max(len(mask_keys) - 1, 0))
+            found = mask_keys[pos] == keys if len(mask_keys) else np.zeros(len(keys), dtype=bool)
+            self._adjacency['slots'] = np.where(found, mask_slots[pos] if len(mask_keys) else -1, -1)
+        return self._adjacency['slots']
+
+    def get_coloring(self):
+        '''
+        Color the nodes so that no two nodes of the same color are neighbors, in either direction.  Nodes are colored
+        greedily, largest degree first.  The coloring is reused until the topology version changes.
+
+        :return: an integer array with the color of each state matrix row
+        '''
+        csr = self.get_adjacency()
+        if self._adjacency['colors'] is None:
+            both = (csr + csr.T).tocsr()
+            colors = np.full(csr.shape[0], -1, dtype=np.intp)
+            for j in np.argsort(-np.diff(both.indptr), kind='stable'):
+                taken = set(colors[both.indices[both.indptr[j]:both.indptr[j + 1]]].tolist())
+                c = 0
+                while c in taken:
+                    c += 1
+                colors[j] = c
+            self._adjacency['colors'] = colors
+        return self._adjacency['colors']
+
     def _check_property(self, name, val):
         '''
         Checks whether a given named value falls within the given parameters defined at the top of this file.
@@ -324,6 +482,7 @@ class SocialNetwork:
         :return: None
         '''
         self.instance.graph[name] = value
+        self.settings = Settings(self.instance.graph)
 
     def _validate_properties(self, **kwargs):
         """
@@ -526,21 +685,23 @@ class SocialNetwork:
         # Erdos-Renyi random graph
         elif topology == 'random':
             if self.prop('symmetric') and self.prop('directed'):
-                edges = nx.erdos_renyi_graph(n, sat / 2, directed=True).edges()
+                edges = nx.fast_gnp_random_graph(n, sat / 2, seed=self._draw_seed(), directed=True).edges()
             else:
-                edges = nx.erdos_renyi_graph(n, sat, directed=self.prop('directed')).edges()
+                edges = nx.fast_gnp_random_graph(n, sat, seed=self._draw_seed(), directed=self.prop('directed')).edges()
 
         # Barabasi-Albert scale free graph
         elif topology == 'scale free':
-            edges = nx.scale_free_graph(n).edges()
+            edges = nx.scale_free_graph(n, seed=self._draw_seed()).edges()
 
         # Watts-Strogatz small world graph
         elif topology == 'small world':
             if not self._has_property('rewire'): self.prop(rewire=.1)
             if self.prop('directed'):
-                edges = nx.watts_strogatz_graph(n, max(int(sat * n * 2), 2), self.prop('rewire')).edges()
+                edges = nx.watts_strogatz_graph(n, max(int(sat * n * 2), 2), self.prop('rewire'),
+                                                seed=self._draw_seed()).edges()
             else:
-                edges = nx.watts_strogatz_graph(n, max(int(sat * n), 2), self.prop('rewire')).edges()
+                edges = nx.watts_strogatz_graph(n, max(int(sat * n), 2), self.prop('rewire'),
+                                                seed=self._draw_seed()).edges()
 
         # Star graph
         elif topology == 'star':
@@ -557,14 +718,13 @@ class SocialNetwork:
         elif topology == 'barbell':
             edges = nx.barbell_graph(int(n/2)-1, 1).edges()
 
-        # Add generated edges to graph structure
-        for (u, v) in edges:
-            self.connect(u, v)
-
         # Add self loops if needed
+        edges = list(edges)
         if self.prop('selfloops'):
-            for i in range(self.prop('n')):
-                self.connect(i, i)
+            edges.extend((i, i) for i in range(self.prop('n')))
+
+        # Add generated edges to graph structure
+        self.connect_many(edges)
 
     def _generate_edge_weights(self, label=None):
         '''
@@ -574,13 +734,7 @@ class SocialNetwork:
         :return: None
         '''
         e = list(self.edges())
-        d = self.prop('weight_dist')
-        if d == 'constant':
-            weights = self._generate_constant_values(len(e), 'weight')
-        elif d == 'uniform':
-            weights = self._generate_uniform_values(len(e), 'weight')
-        elif d == 'normal':
-            weights = self._generate_normal_values(len(e), 'weight')
+        weights = self._generate_values(len(e), 'weight')
         for i in range(len(e)):
             u, v = e[i]
             weight = weights[i]
@@ -606,6 +760,30 @@ class SocialNetwork:
             weight = self._generate_normal_values(1, 'weight')[0]
         self._init_edge_weight(u, v, weight, label)
 
+    def _draw_seed(self):
+        '''
+        Draw a seed from self.rng for a NetworkX generator.
+
+        :return: an integer seed
+        '''
+        return int(self.rng.integers(2 ** 32))
+
+    def _generate_values(self, numvals, tag):
+        '''
+        Draw numvals values from the distribution named by the property f'{tag}_dist'.
+
+        :param numvals: the number of values to draw
+        :param tag: a string representing the characteristic to draw values for
+        :return: array of values
+        '''
+        d = self.prop(f'{tag}_dist')
+        if d == 'constant':
+            return self._generate_constant_values(numvals, tag)
+        elif d == 'uniform':
+            return self._generate_uniform_values(numvals, tag)
+        elif d == 'normal':
+            return self._generate_normal_values(numvals, tag)
+
     def _generate_constant_values(self, numvals, tag):
         '''
 
@@ -623,20 +801,19 @@ class SocialNetwork:
         :return:
         '''
         lo, hi = self.props(f'{tag}_min', f'{tag}_max')
-        return np.random.uniform(lo, hi, numvals)
+        return self.rng.uniform(lo, hi, numvals)
 
     def _generate_normal_values(self, numvals, tag):
-        ret = []
+        '''
+        Draw numvals values from a normal distribution truncated to [f'{tag}_min', f'{tag}_max'].
+
+        :param numvals: the number of values to draw
+        :param tag: a string representing the characteristic to draw values for
+        :return: array of values
+        '''
         lo, hi = self.props(f'{tag}_min', f'{tag}_max')
         mu, sigma = self.props(f'{tag}_mean', f'{tag}_stdev')
-
-        # Generate random numbers 50 at a time to fill up the array.
-        while True:
-            for w in np.random.normal(mu, sigma, 50):
-                if len(ret) == numvals:
-                    return ret
-                if lo <= w <= hi:
-                    ret.append(w)
+        return truncated_normal(mu, sigma, lo, hi, numvals, rng=self.rng)
 
     def _init_edge_weight(self, u, v, weight, label=None):
         '''
@@ -655,45 +832,34 @@ class SocialNetwork:
         else:
             self[u][v]['weight'] = weight
 
-    def _update_normalized_edge_weights(self, u):
+    def _update_normalized_edge_weights(self, u, v):
         '''
-        Update the 'normalized_weights' property of node u to reflect the fractional influence of each of its
-        neighbors.  Note that in MultiGraphs and MultiDiGraphs, multiple edges from the same neighbor are considered
-        in total for that neighbor.
+        Update the running totals behind the 'normalized_weights' property after the edges between u and v have
+        changed.  Only the weights between u and v are recomputed, so the cost does not depend on the degree of either
+        node.  Note that in MultiGraphs and MultiDiGraphs, multiple edges from the same neighbor are considered in
+        total for that neighbor.
 
-        :param u: the node to update neighbor weights for
+        :param u: endpoint of the changed edges
+        :param v: endpoint of the changed edges
         :return: None
         '''
 
         # Exit if graph doesn't require normalized weights
-        if not self.prop('normalize'):
+        if not self.settings.normalize:
             return
 
         # Exit if weight distribution is blank
-        if self.prop('weight_dist') == '-':
+        if self.settings.weight_dist == '-':
             return
 
-        d = {}
-        nbrs = self.neighbors(u) if not self.prop('directed') else self.predecessors(u)
-
-        # Iterate through neighbors of u and add up their respective total weights
-        for nbr in nbrs:
-            d[nbr] = 0
-            if self.prop('multiedge'):
-                for label in self[nbr][u]:
-                    d[nbr] += self[nbr][u][label]['weight']
+        # Edges from a to b give a influence over b
+        for a, b in [(u, v), (v, u)]:
+            if b not in self[a]:
+                self.pair_weights.remove(b, a)
+            elif self.settings.multiedge:
+                self.pair_weights.set(b, a, sum(e['weight'] for e in self[a][b].values()))
             else:
-                d[nbr] += self[nbr][u]['weight']
-
-        # Return if no neighbors
-        if not d:
-            return
-
-        # Assign each neighbor its total weight / the total incoming weight to u
-        total = sum(d.values())
-        for nbr in d:
-            d[nbr] /= total
-        self.instance.graph['normalized_weights'][u] = d
+                self.pair_weights.set(b, a, self[a][b]['weight'])
 
     def _init_certainty(self):
         d = self.prop('certainty_dist')
@@ -740,15 +906,16 @@ class SocialNetwork:
 
     def _init_diffusion_space(self):
         '''
-        Initialize a dictionary to represent the diffusion values of nodes in the network.
+        Initialize a matrix to represent the diffusion values of nodes in the network.
         Can be any number of dimensions, governed by the 'num_dimensions' property.
+        Row i of self.states holds the values of node self.node_list[i]; self.node_index maps nodes back to rows.
+        Categorical values are stored as integer codes into self.categories.
 
         :return: None
         '''
         mynodes = list(self.nodes())
         n = len(mynodes)
         k = self.prop('num_dimensions')
-        d = {}
         matrix = []
 
         # If diffusion space is binary OR it is continuous but needs to be initialized at maximal and minimal values,
@@ -757,49 +924,98 @@ class SocialNetwork:
                                                    self.prop('dimensions') == 'continuous'):
             for i in range(k):
                 vec = [1 for j in range(n // 2)] + [-1 for j in range(n // 2)]
-                while len(vec) < n:
-                    vec.append(random.choice([-1, 1]))
-                random.shuffle(vec)
+                vec += self.rng.choice([-1, 1], n - len(vec)).tolist()
+                self.rng.shuffle(vec)
                 matrix.append(vec)
 
         # Otherwise, set them to random real values in the range [-1, 1].
         elif self.prop('dimensions') == 'continuous':
-            matrix = [[2 * rnd.random() - 1 for j in range(n)]
-                      for i in range(k)]
+            matrix = (2 * self.rng.random((k, n)) - 1).tolist()
 
         elif self.prop('dimensions') == 'categorical':
             matrix = self._init_transmission_values()
 
-        matrix = np.array(matrix).T
+        self.node_list = mynodes
+        self.node_index = {node: row for row, node in enumerate(mynodes)}
 
-        row = 0
-        for node in mynodes:
-            d[node] = list(matrix[row])
-            row += 1
+        # Categorical values are replaced by their integer codes so that the matrix stays numeric.
+        if self.prop('dimensions') == 'categorical':
+            self.categories = list(self.prop('category_dist').keys())
+            matrix = [[self._category_code(val) for val in vec] for vec in matrix]
+            self.states = np.array(matrix, dtype=np.int64).reshape(k, n).T.copy()
+        else:
+            self.categories = None
+            self.states = np.array(matrix, dtype=np.float64).reshape(k, n).T.copy()
+
+        # Set the attribute 'diffusion_space' to a read-only view of the matrix.
+        self.prop(diffusion_space=StateView(self))
 
-        # Set the attribute 'diffusion_space' to a numpy representation of the matrix.
-        self.prop(diffusion_space=d)
+    def _category_code(self, val):
+        '''
+        Return the integer code used to store categorical value val, registering it if it is new.
+
+        :param val: a categorical value
+        :return: the integer code of val
+        '''
+        if val not in self.categories:
+            self.categories.append(val)
+        return self.categories.index(val)
+
+    def get_state(self, u):
+        '''
+        Return a copy of node u's diffusion values.
+
+        :param u: the node
+        :return: a list of diffusion values
+        '''
+        row = self.states[self.node_index[u]]
+        if self.categories is not None:
+            return [self.categories[code] for code in row]
+        return row.tolist()
+
+    def set_state(self, u, vals):
+        '''
+        Overwrite node u's diffusion values.
+
+        :param u: the node
+        :param vals: a sequence of num_dimensions diffusion values
+        :return: None
+        '''
+        if self.categories is not None:
+            vals = [self._category_code(val) for val in vals]
+        self.states[self.node_index[u]] = vals
 
     def _init_masks(self):
         '''
-        Initialize dictionary for visibility values.
+        Initialize storage for visibility values.
         If node i knows what node j's value in dimension k is, then
-        self.prop('masks')[i][j][k] is that value, otherwise it is 0.
+        self.prop('masks')[i][j][k] is 1, otherwise it is 0.
+        Masks are kept bit-packed in self.mask_store; the 'masks' property is a read-only view of it.
 
         :return: None
         '''
 
         mynodes = list(self.nodes())
-        n = len(mynodes)
         k = self.prop('num_dimensions')
 
-        # Set 'masks' attribute to a new dictionary with blank dictionaries for each node.
-        self.prop(masks={i: {} for i in range(n)})
+        self.mask_store = MaskStore(k, capacity=max(16, len(mynodes)), index=self.node_index)
+        self.prop(masks=MaskView(self))
 
         # Each node knows its own diffusion values if selfloops are enforced.
-        for node in mynodes:
-            if self.prop('selfloops'):
-                self.instance.graph['masks'][node][node] = [1 for d in range(k)]
+        if self.prop('selfloops'):
+            self.mask_store.set([self.mask_store.slot(node, node) for node in mynodes], 1)
+
+    def _init_normalized_weights(self):
+        '''
+        Initialize the running totals behind normalized edge weights.
+        self.pair_weights holds the total weight of the edges between each pair of nodes, along with the sum of each
+        node's incoming weights.  The 'normalized_weights' property is a read-only view dividing one by the other.
+
+        :return: None
+        '''
+        self.pair_weights = PairWeights(self)
+        if self.prop('normalize'):
+            self.prop(normalized_weights=NormalizedWeightView(self))
 
     def _init_transmission_values(self):
         n = self.number_of_nodes()
@@ -838,7 +1054,7 @@ class SocialNetwork:
                 vec.append(max_t)
 
             # Randomly shuffle values.
-            rnd.shuffle(vec)
+            self.rng.shuffle(vec)
             matrix.append(vec)
 
         return matrix
@@ -890,7 +1106,7 @@ class SocialNetwork:
             types.append(max_t)
 
         # Randomly shuffle agent types.
-        rnd.shuffle(types)
+        self.rng.shuffle(types)
 
         # Update indexes_by_type property for quick retrieval of all agents of a particular type.
         for node, idx in zip(mynodes, range(n)):
@@ -932,14 +1148,36 @@ class SocialNetwork:
         :param v: the observed node
         :return: a vector of diffusion values
         '''
-        k = self.prop('num_dimensions')
+        k = self.settings.num_dimensions
 
         # Return all zeroes if u and v are not friends
         if u not in self[v]:
             return [0 for i in range(k)]
 
-        v_vals = self.prop('diffusion_space')[v]
-        return [v_vals[i] if self.prop('masks')[u][v][i] == 1 else 0 for i in range(k)]
+        v_vals = self.get_state(v)
+        mask = self.mask_store.gather(self.mask_store.slots[u][v])
+        return [v_vals[i] if mask[i] else 0 for i in range(k)]
+
+    def get_neighborhood_array(self, u):
+        '''
+        Return everything u can see of its neighbors' diffusion values as one array.  Neighbors are the nodes
+        adjacent to u in undirected graphs and u's predecessors in directed graphs.
+
+        :param u: the node observing its neighborhood
+        :return: a list of u's neighbors, and an array whose rows are u's view of each of those neighbors
+                 (hidden values are 0; categorical values are given as integer codes)
+        '''
+        # Read the neighborhood from the adjacency snapshot if it is up to date, otherwise from the graph itself.
+        if self._adjacency_is_current():
+            csc = self.get_adjacency(inbound=True)
+            lo, hi = csc.indptr[self.node_index[u]], csc.indptr[self.node_index[u] + 1]
+            rows, slots = csc.indices[lo:hi], self.get_influence_slots()[lo:hi]
+            nbrs = [self.node_list[i] for i in rows]
+        else:
+            nbrs = list(self.predecessors(u) if self.settings.directed else self.neighbors(u))
+            slots = [self.mask_store.slots[u][v] for v in nbrs]
+            rows = [self.node_index[v] for v in nbrs]
+        return nbrs, np.where(self.mask_store.gather(slots), self.states[rows], 0)
 
     def get_neighborhood_view(self, u):
         '''
@@ -948,8 +1186,11 @@ class SocialNetwork:
         :param u: the node observing its neighborhood
         :return: a list containing u's view of each of its neighbors
         '''
-        return {v: self.get_view(u, v) for v in self[u]} if not self.prop('directed') \
-            else {v: self.get_view(u, v) for v in self.predecessors(u)}
+        if self.categories is not None:
+            return {v: self.get_view(u, v) for v in self[u]} if not self.settings.directed \
+                else {v: self.get_view(u, v) for v in self.predecessors(u)}
+        nbrs, views = self.get_neighborhood_array(u)
+        return dict(zip(nbrs, views.tolist()))
 
     def reset_view(self, u, v, visibility='hidden'):
         '''
@@ -965,20 +1206,17 @@ class SocialNetwork:
         if u == v or v not in self[u]:
             return
 
-        K = self.prop('num_dimensions')
-        sym = all(self.props('directed', 'symmetric')) or (not self.prop('directed'))
-
-        self.instance.graph['masks'][v][u] = [0 for i in range(K)]
-        if sym: self.instance.graph['masks'][u][v] = [0 for i in range(K)]
+        K = self.settings.num_dimensions
+        sym = self.settings.symmetric or not self.settings.directed
+        slots = [self.mask_store.slot(v, u)]
+        if sym: slots.append(self.mask_store.slot(u, v))
 
         if visibility == 'random':
-            for k in range(K):
-                self.instance.graph['masks'][v][u][k] = rnd.choice([0, 1])
-                if sym: self.instance.graph['masks'][u][v][k] = rnd.choice([0, 1])
+            self.mask_store.set(slots, self.rng.integers(0, 2, (len(slots), K)))
         elif visibility == 'visible':
-            for k in range(K):
-                self.instance.graph['masks'][v][u][k] = 1
-                if sym: self.instance.graph['masks'][u][v][k] = 1
+            self.mask_store.set(slots, 1)
+        else:
+            self.mask_store.set(slots, 0)
 
     def hide(self, u, v, k):
         '''
@@ -991,7 +1229,7 @@ class SocialNetwork:
         '''
         if v not in self[u] or u == v:
             return
-        self.instance.graph['masks'][v][u][k] = 0
+        self.mask_store.set_bit(self.mask_store.slots[v][u], k, 0)
 
     def hide_all(self, u, v):
         '''
@@ -1003,8 +1241,7 @@ class SocialNetwork:
         '''
         if v not in self[u] or u == v:
             return
-        for i in range(self.prop('num_dimensions')):
-            self.instance.graph['masks'][v][u][i] = 0
+        self.mask_store.set(self.mask_store.slots[v][u], 0)
 
     def reveal(self, u, v, k):
         '''
@@ -1017,7 +1254,7 @@ class SocialNetwork:
         '''
         if v not in self[u]:
             return
-        self.instance.graph['masks'][v][u][k] = 1
+        self.mask_store.set_bit(self.mask_store.slots[v][u], k, 1)
 
     def reveal_all(self, u, v):
         '''
@@ -1029,8 +1266,17 @@ class SocialNetwork:
         '''
         if v not in self[u]:
             return
-        for i in range(self.prop('num_dimensions')):
-            self.instance.graph['masks'][v][u][i] = 1
+        self.mask_store.set(self.mask_store.slots[v][u], 1)
+
+    def _audience_slots(self, u, include_self=True):
+        '''
+        Return the mask slots through which u's neighbors see u.
+
+        :param u: the observed node
+        :param include_self: whether to include u's view of itself
+        :return: a list of mask slots
+        '''
+        return [self.mask_store.slots[v][u] for v in self[u] if include_self or v != u]
 
     def broadcast(self, u, k):
         '''
@@ -1040,8 +1286,7 @@ class SocialNetwork:
         :param k: the dimension to be broadcast
         :return: None
         '''
-        for v in self[u]:
-            self.reveal(u, v, k)
+        self.mask_store.set_bit(self._audience_slots(u), k, 1)
 
     def broadcast_all(self, u):
         '''
@@ -1050,8 +1295,7 @@ class SocialNetwork:
         :param u: the broadcasting node
         :return: None
         '''
-        for v in self[u]:
-            self.reveal_all(u, v)
+        self.mask_store.set(self._audience_slots(u), 1)
 
     def nocast(self, u, k):
         '''
@@ -1061,8 +1305,7 @@ class SocialNetwork:
         :param k: the dimension to be nocast
         :return: None
         '''
-        for v in self[u]:
-            self.hide(u, v, k)
+        self.mask_store.set_bit(self._audience_slots(u, include_self=False), k, 0)
 
     def nocast_all(self, u):
         '''
@@ -1071,8 +1314,7 @@ class SocialNetwork:
         :param u: the nocasting node
         :return: None
         '''
-        for v in self[u]:
-            self.hide_all(u, v)
+        self.mask_store.set(self._audience_slots(u, include_self=False), 0)
 
     def property(self, arg=None, **kwargs):
         '''
@@ -1107,6 +1349,7 @@ class SocialNetwork:
             # Set new value(s)
             for key in kwargs:
                 self.instance.graph[key] = kwargs[key]
+            self.settings = Settings(self.instance.graph)
 
         # Caller provided a single getter argument.  Try to return the property.
         # Throw an error if it doesn't exist.
@@ -1139,7 +1382,7 @@ class SocialNetwork:
 
         :return: True if built from nx.Graph, False otherwise
         '''
-        return self.prop('graphtype') == 'graph'
+        return self.settings.graphtype == 'graph'
 
     def isdigraph(self):
         '''
@@ -1147,7 +1390,7 @@ class SocialNetwork:
 
         :return: True if built from nx.DiGraph, False otherwise
         '''
-        return self.prop('graphtype') == 'digraph'
+        return self.settings.graphtype == 'digraph'
 
     def ismultigraph(self):
         '''
@@ -1155,7 +1398,7 @@ class SocialNetwork:
 
         :return: True if built from nx.MultiGraph, False otherwise
         '''
-        return self.prop('graphtype') == 'multigraph'
+        return self.settings.graphtype == 'multigraph'
 
     def ismultidigraph(self):
         '''
@@ -1163,7 +1406,7 @@ class SocialNetwork:
 
         :return: True if built from nx.MultiDiGraph, False otherwise
         '''
-        return self.prop('graphtype') == 'multidigraph'
+        return self.settings.graphtype == 'multidigraph'
 
     def get_influencers(self, u):
         '''
@@ -1177,34 +1420,36 @@ class SocialNetwork:
             del nbrs[u]
 
         # If using confidence bound, trim out neighbors who do not produce enough reward
-        if self.prop('confidence_dist') != '-':
-            nbrs = {nbr: self.get_view(u, nbr) for nbr in nbrs if self.reward(u, nbr) >= (1 - self.prop('confidence')[u])
-                    or u == nbr}
+        if self.settings.confidence_dist != '-':
+            rewards = self.reward_many(u, nbrs)
+            nbrs = {nbr: nbrs[nbr] for nbr, r in zip(list(nbrs), rewards) if r >= (1 - self.settings.confidence[u])}
 
-        if self.prop('num_influencers') > len(nbrs):
+        if self.settings.num_influencers > len(nbrs):
             num_influencers = len(nbrs)
         else:
-            num_influencers = min(self.prop('num_influencers'), len(nbrs))
+            num_influencers = min(self.settings.num_influencers, len(nbrs))
 
         nbrkeys = [key for key in nbrs if key != u]
-        random.shuffle(nbrkeys)
+        self.rng.shuffle(nbrkeys)
         nbrs = {nbr: self.get_view(u, nbr) for nbr in nbrkeys[:num_influencers]}
-        if self.prop('selfloops'):
+        if self.settings.selfloops:
             nbrs[u] = self.get_view(u, u)
 
         return nbrs
 
-    def get_local_average(self, u, weighted=False):
+    def get_local_average(self, u, weighted=False, nbrs=None):
         """
 
         :param u: The node whose neighborhood should be averaged
         :param weighted:
+        :param nbrs: u's influencers, as returned by get_influencers(); drawn here if not given
         :return:
         """
-        nbrs = self.get_influencers(u)
+        if nbrs is None:
+            nbrs = self.get_influencers(u)
 
         # Unweighted average
-        if self.prop('weight_dist') == '-' or not weighted:
+        if self.settings.weight_dist == '-' or not weighted:
             ret = self.simple_average(nbrs)
         else:
             weights = self.prop('normalized_weights')[u]
@@ -1231,19 +1476,19 @@ class SocialNetwork:
         ret = []
 
         # Do not add the edge if it is a selfloop and those are not allowed
-        if (u == v) and (not self.prop('selfloops')):
+        if (u == v) and (not self.settings.selfloops):
             return []
 
         # Add edge with probability p
-        if coin_flip(p):
+        if p >= 1 or self.rng.random() < p:
 
-            if (not self.prop('directed')) and (u > v):
+            if (not self.settings.directed) and (u > v):
                 temp = u
                 u = v
                 v = temp
 
             # If the object is a MultiGraph or MultiDiGraph, connect a labeled multiedge
-            if self.prop('multiedge'):
+            if self.settings.multiedge:
                 ret = self.connect_multi(u, v, label, **kwargs)
 
             # Otherwise, create an unlabeled edge
@@ -1256,7 +1501,7 @@ class SocialNetwork:
                     self._generate_edge_weight(u, v)
 
                 # Add symmetric edge and generate weight if necessary
-                if all(self.props('symmetric', 'directed')):
+                if self.settings.symmetric and self.settings.directed:
                     ret.append((v, u))
                     self.add_edge(v, u, **kwargs)
                     if 'weight' not in kwargs:
@@ -1264,9 +1509,82 @@ class SocialNetwork:
 
             # Reset the relevant masks and normalized weights if necessary.
             # These features are 1-per-node, so they can be handled here whether the graph allows multiedges or not.
-            self.reset_view(u, v, visibility=self.prop('visibility'))
-            self._update_normalized_edge_weights(u)
-            self._update_normalized_edge_weights(v)
+            self.reset_view(u, v, visibility=self.settings.visibility)
+            self._update_normalized_edge_weights(u, v)
+
+        return ret
+
+    def connect_many(self, edges, p=1., **kwargs):
+        '''
+        Add many edges at once, each with probability p.  Behaves like calling connect() on every edge, but adds the
+        edges, draws their weights, resets their masks and normalizes weights in bulk.
+
+        :param edges: An iterable of (u, v) pairs
+        :param p: The probability to create each edge
+        :param kwargs: Any other named parameters to be passed through to NetworkX
+        :return: A list of edges added, including symmetric edges
+                 List will contain labeled edges if multiedges are allowed
+        '''
+        settings = self.settings
+        directed, symmetric, selfloops, multiedge = (settings.directed, settings.symmetric, settings.selfloops,
+                                                     settings.multiedge)
+
+        # Do not add selfloops if those are not allowed, and add each remaining edge with probability p
+        edges = [(u, v) for (u, v) in edges if selfloops or u != v]
+        if p < 1.:
+            edges = [e for e, keep in zip(edges, self.rng.random(len(edges)) < p) if keep]
+        if not directed:
+            edges = [(u, v) if u <= v else (v, u) for (u, v) in edges]
+        if not edges:
+            return []
+
+        # Draw all weights in one call, one per edge added
+        weighted = 'weight' not in kwargs and self.settings.weight_dist != '-'
+        sym = directed and symmetric
+        if weighted:
+            weights = list(self._generate_values(len(edges) * (2 if sym else 1), 'weight'))
+
+        ret = []
+        if multiedge:
+            # Pick each new label as new_edge_key() would if the edges were added one at a time, and reuse it for
+            # the symmetric edge
+            keys = {}
+            for (u, v) in edges:
+                if (u, v) not in keys:
+                    keys[(u, v)] = set(self[u][v]) if v in self[u] else set()
+                label = len(keys[(u, v)])
+                while label in keys[(u, v)]:
+                    label += 1
+                keys[(u, v)].add(label)
+                ret.append((u, v, label))
+                if sym:
+                    keys.setdefault((v, u), set(self[v][u]) if u in self[v] else set()).add(label)
+                    ret.append((v, u, label))
+        else:
+            for (u, v) in edges:
+                ret.append((u, v))
+                if sym:
+                    ret.append((v, u))
+        self.add_edges_from([e + ({'weight': w},) for e, w in zip(ret, weights)] if weighted else ret, **kwargs)
+
+        # Reset the masks of every new edge in one call, as reset_view() would for each of them
+        both = sym or not directed
+        slots = []
+        for (u, v) in edges:
+            if u != v:
+                slots.append(self.mask_store.slot(v, u))
+                if both:
+                    slots.append(self.mask_store.slot(u, v))
+        visibility = self.settings.visibility
+        if slots:
+            if visibility == 'random':
+                self.mask_store.set(slots, self.rng.integers(0, 2, (len(slots), self.settings.num_dimensions)))
+            else:
+                self.mask_store.set(slots, 1 if visibility == 'visible' else 0)
+
+        # Update the normalized weights of each touched pair once
+        for (u, v) in set(edges):
+            self._update_normalized_edge_weights(u, v)
 
         return ret
 
@@ -1294,7 +1612,7 @@ class SocialNetwork:
         ret.append((u, v, label))
 
         # Add a symmetric edge if necessary
-        if all(self.props('symmetric', 'directed')):
+        if self.settings.symmetric and self.settings.directed:
             self.add_edge(v, u, label, **kwargs)
             if 'weight' not in kwargs:
                 self._generate_edge_weight(v, u, label)
@@ -1317,16 +1635,16 @@ class SocialNetwork:
         ret = []
 
         # If the edge is a selfloop and selfloops must be maintained, return
-        if (u == v) and (self.prop('selfloops')):
+        if (u == v) and (self.settings.selfloops):
             return
 
-        if (not self.prop('directed')) and (u > v):
+        if (not self.settings.directed) and (u > v):
             temp = u
             u = v
             v = temp
 
         # Remove the edge with probability p
-        if coin_flip(p):
+        if p >= 1 or self.rng.random() < p:
 
             # If the object is a MultiGraph or MultiDiGraph, delete a labeled multiedge
             if self.ismultigraph() or self.ismultidigraph():
@@ -1336,26 +1654,73 @@ class SocialNetwork:
             else:
                 ret.append((u, v))
                 self.remove_edge(u, v)
-                del self.instance.graph['masks'][v][u]
-                if self.prop('normalize'):
-                    del self.instance.graph['normalized_weights'][v][u]
+                self.mask_store.remove(v, u)
 
                 # Remove symmetric edge if necessary
-                if all(self.props('symmetric', 'directed')):
+                if self.settings.symmetric and self.settings.directed:
                     ret.append((v, u))
                     self.remove_edge(v, u)
 
-                # If mask visibility and weights are mutual, then delete the symmetric counterparts
-                if all(self.props('symmetric', 'directed')) or not self.prop('directed'):
-                    del self.instance.graph['masks'][u][v]
-                    if self.prop('normalize'):
-                        del self.instance.graph['normalized_weights'][u][v]
+                # If mask visibility is mutual, then delete the symmetric counterpart
+                if self.settings.symmetric or not self.settings.directed:
+                    self.mask_store.remove(u, v)
 
             # No need to reset view here because we delete the mask from u to v (and possibly from v to u) above,
             # and no other views are changed by this edge deletion.
             # However, we do need to renormalize edge weights.
-            self._update_normalized_edge_weights(u)
-            self._update_normalized_edge_weights(v)
+            self._update_normalized_edge_weights(u, v)
+
+        return ret
+
+    def disconnect_many(self, edges, p=1.):
+        '''
+        Remove many edges at once, each with probability p.  Behaves like calling disconnect() on every edge, but
+        removes the edges, deletes their masks and normalizes weights in bulk.  Edges that no longer exist by the
+        time they come up, such as the symmetric counterpart of an edge already removed, are skipped.
+
+        :param edges: An iterable of (u, v) pairs
+        :param p: The probability to delete each edge
+        :return: A list of edges removed, including symmetric edges
+                 List will contain all labeled edges if multiedges are allowed
+        '''
+        settings = self.settings
+        directed, symmetric, selfloops, multiedge = (settings.directed, settings.symmetric, settings.selfloops,
+                                                     settings.multiedge)
+
+        # Keep selfloops if those must be maintained, and remove each remaining edge with probability p
+        edges = [(u, v) for (u, v) in edges if u != v or not selfloops]
+        if p < 1.:
+            edges = [e for e, keep in zip(edges, self.rng.random(len(edges)) < p) if keep]
+        if not directed:
+            edges = [(u, v) if u <= v else (v, u) for (u, v) in edges]
+
+        # Collect every edge (and symmetric edge) to remove, once each
+        sym = directed and symmetric
+        pairs, ret = [], []
+        gone = set()
+        for (u, v) in edges:
+            if (u, v) in gone or v not in self[u]:
+                continue
+            pairs.append((u, v))
+            gone.add((u, v))
+            ret.extend([(u, v, label) for label in self[u][v]] if multiedge else [(u, v)])
+            if sym and u in self[v]:
+                gone.add((v, u))
+                ret.extend([(v, u, label) for label in self[v][u]] if multiedge else [(v, u)])
+        if not ret:
+            return []
+        self.remove_edges_from(ret)
+
+        # Delete the masks of every removed edge, as disconnect() would for each of them
+        for (u, v) in pairs:
+            if u != v:
+                self.mask_store.remove(v, u)
+                if symmetric or not directed:
+                    self.mask_store.remove(u, v)
+
+        # Update the normalized weights of each touched pair once
+        for (u, v) in pairs:
+            self._update_normalized_edge_weights(u, v)
 
         return ret
 
@@ -1380,45 +1745,43 @@ class SocialNetwork:
             self.remove_edge(u, v, label)
 
             # Remove symmetric edge if necessary
-            if all(self.props('symmetric', 'directed')):
+            if self.settings.symmetric and self.settings.directed:
                 ret.append((v, u, label))
                 self.remove_edge(v, u, label)
 
         # If no label was provided, assume that all edges from u to v need to be removed.
         else:
             ret = [(u, v, mylabel) for mylabel in self[u][v]]
-            if all(self.props('symmetric', 'directed')):
+            if self.settings.symmetric and self.settings.directed:
                 ret.extend([(v, u, mylabel) for mylabel in self[v][u]])
             # Empty out the edge list from u to v and, if necessary, v to u
             while v in self[u]:
                 self.remove_edge(u, v)
-                if all(self.props('symmetric', 'directed')):
+                if self.settings.symmetric and self.settings.directed:
                     self.remove_edge(v, u)
 
-        # If u and v are now not connected, remove masks and normalized weights
+        # If u and v are now not connected, remove masks
         if v not in self[u]:
-            del self.instance.graph['masks'][v][u]
-            if self.prop('normalize'):
-                del self.instance.graph['normalized_weights'][v][u]
+            self.mask_store.remove(v, u)
 
-            # If necessary, also remove symmetric mask and normalized weight
-            if all(self.props('symmetric', 'directed')) or not self.prop('directed'):
-                del self.instance.graph['masks'][u][v]
-                if self.prop('normalize'):
-                    del self.instance.graph['normalized_weights'][u][v]
+            # If necessary, also remove symmetric mask
+            if self.settings.symmetric or not self.settings.directed:
+                self.mask_store.remove(u, v)
 
         return ret
 
-    def nextstate_voter(self, u):
+    def nextstate_voter(self, u, nbrs=None):
         '''
 
         :param u: The node to update
+        :param nbrs: u's influencers, as returned by get_influencers(); drawn here if not given
         :return: None
         '''
-        myvals = self.prop('diffusion_space')[u]
-        K = self.prop('num_dimensions')
+        myvals = self.get_state(u)
+        K = self.settings.num_dimensions
         next_state = []
-        nbrs = self.get_influencers(u)
+        if nbrs is None:
+            nbrs = self.get_influencers(u)
 
         # Iterate over each dimension
         for k in range(K):
@@ -1429,16 +1792,46 @@ class SocialNetwork:
             next_state.append(curr)
         return next_state
 
-    def nextstate_majority(self, u):
+    def nextstate_qvoter(self, u, nbrs=None):
         '''
+        Node u samples 'q' of its influencers, with replacement, and adopts their value in every dimension where all
+        of them agree.
 
         :param u: The node to update
+        :param nbrs: u's influencers, as returned by get_influencers(); drawn here if not given
         :return: None
         '''
-        myvals = self.prop('diffusion_space')[u]
-        K = self.prop('num_dimensions')
+        myvals = self.get_state(u)
+        if nbrs is None:
+            nbrs = self.get_influencers(u)
+        nbrs = {v: view for v, view in nbrs.items() if v != u}
+        if not nbrs:
+            return myvals
+        views = list(nbrs.values())
+        panel = [views[i] for i in self.rng.integers(0, len(views), self.settings.q)]
+
+        # Iterate over each dimension
         next_state = []
-        nbrs = self.get_influencers(u)
+        for k in range(self.settings.num_dimensions):
+            curr = myvals[k]
+            vals = [view[k] for view in panel]
+            if all([i == vals[0] for i in vals]):
+                curr = vals[0]
+            next_state.append(curr)
+        return next_state
+
+    def nextstate_majority(self, u, nbrs=None):
+        '''
+
+        :param u: The node to update
+        :param nbrs: u's influencers, as returned by get_influencers(); drawn here if not given
+        :return: None
+        '''
+        myvals = self.get_state(u)
+        K = self.settings.num_dimensions
+        next_state = []
+        if nbrs is None:
+            nbrs = self.get_influencers(u)
 
         # Iterate over each dimension
         for k in range(K):
@@ -1457,16 +1850,18 @@ class SocialNetwork:
             next_state.append(curr)
         return next_state
 
-    def nextstate_plurality(self, u):
+    def nextstate_plurality(self, u, nbrs=None):
         '''
 
         :param u: The node to update
+        :param nbrs: u's influencers, as returned by get_influencers(); drawn here if not given
         :return: None
         '''
-        myvals = self.prop('diffusion_space')[u]
-        K = self.prop('num_dimensions')
+        myvals = self.get_state(u)
+        K = self.settings.num_dimensions
         next_state = []
-        nbrs = self.get_influencers(u)
+        if nbrs is None:
+            nbrs = self.get_influencers(u)
 
         for k in range(K):
             curr = myvals[k]
@@ -1490,17 +1885,19 @@ class SocialNetwork:
                 next_state.append(maxval)
         return next_state
 
-    def next_state_transmission(self, u):
+    def next_state_transmission(self, u, nbrs=None):
         '''
 
         :param u:
+        :param nbrs: u's influencers, as returned by get_influencers(); drawn here if not given
         :return:
         '''
-        myvals = self.prop('diffusion_space')[u]
-        K = self.prop('num_dimensions')
+        myvals = self.get_state(u)
+        K = self.settings.num_dimensions
         next_state = []
-        nbrs = self.get_influencers(u)
-        model = self.prop('transmission_probs')
+        if nbrs is None:
+            nbrs = self.get_influencers(u)
+        model = self.settings.transmission_probs
 
         # Iterate over each dimension
         for k in range(K):
@@ -1519,7 +1916,7 @@ class SocialNetwork:
                         if i not in model[curr]['contact']:
                             continue
                         cond, p = model[curr]['contact'][i]
-                        if coin_flip(p):
+                        if self.rng.random() < p:
                             next_state.append(cond)
                             changed = True
                             break
@@ -1531,7 +1928,7 @@ class SocialNetwork:
                 if 'auto' in model[curr]:
                     for i in model[curr]['auto']:
                         p = model[curr]['auto'][i]
-                        if coin_flip(p):
+                        if self.rng.random() < p:
                             next_state.append(i)
                             changed = True
                             break
@@ -1541,33 +1938,277 @@ class SocialNetwork:
 
         return next_state
 
-    def nextstate_average(self, u):
-        if self.prop('update_method') == 'average':
-            local_avg = self.get_local_average(u)
-        elif self.prop('update_method') == 'wt. avg.':
-            local_avg = self.get_local_average(u, weighted=True)
-        myvals = self.prop('diffusion_space')[u]
-        K = self.prop('num_dimensions')
+    def compile_transmission(self):
+        '''
+        Compile the 'transmission_probs' property into arrays indexed by category code.  Every state the model
+        mentions is registered as a category.  The arrays are reused until the property is replaced or new categories
+        appear.
+
+        :return: a dict of arrays, where for states a and b:
+                 'contact_p'[a, b] is the probability that a node in state a moves when it sees a node in state b
+                 'contact_to'[a, b] is the state it moves to, or -1 if there is no such transition
+                 'auto_cum'[a, j] is the probability that one of the first j + 1 automatic transitions out of a fires
+                 'auto_p'[a, j] is the probability of automatic transition j out of a
+                 'auto_to'[a, j] is the state the automatic transition j leads to, or -1
+        '''
+        model = self.settings.transmission_probs
+        cache = self._transmission
+        if cache is not None and cache['model'] is model and cache['size'] == len(self.categories):
+            return cache
+
+        # Register every state the model mentions
+        code = self._category_code
+        for a in model:
+            code(a)
+            for b, (to, p) in model[a].get('contact', {}).items():
+                code(b), code(to)
+            for to in model[a].get('auto', {}):
+                code(to)
+
+        C = len(self.categories)
+        J = max([len(model[a].get('auto', {})) for a in model] + [1])
+        contact_p, contact_to = np.zeros((C, C)), np.full((C, C), -1, dtype=np.int64)
+        auto_p, auto_cum, auto_to = np.zeros((C, J)), np.zeros((C, J)), np.full((C, J), -1, dtype=np.int64)
+        for a in model:
+            for b, (to, p) in model[a].get('contact', {}).items():
+                contact_p[code(a), code(b)], contact_to[code(a), code(b)] = p, code(to)
+
+            # Automatic transitions are tried in order, so transition j fires if all earlier ones did not.
+            stay = 1.
+            for j, (to, p) in enumerate(model[a].get('auto', {}).items()):
+                stay *= 1 - p
+                auto_p[code(a), j], auto_cum[code(a), j], auto_to[code(a), j] = p, 1 - stay, code(to)
+            auto_cum[code(a), len(model[a].get('auto', {})):] = 1 - stay
+
+        self._transmission = {'model': model, 'size': C, 'contact_p': contact_p, 'contact_to': contact_to,
+                              'auto_p': auto_p, 'auto_cum': auto_cum, 'auto_to': auto_to}
+        return self._transmission
+
+    def nextstates_transmission(self, nodes):
+        '''
+        Compute the next states of several nodes at once under the 'transmission' update method, with the same
+        transition probabilities as next_state_transmission().
+        A node moves through contact with probability 1 - prod(1 - p) over the influencers it sees in a contagious
+        state; these products are summed in log space with one sparse product and checked with one random draw per
+        node.  Only nodes whose contacts could move them to different states replay the per-influencer coin flips,
+        so that the first success in a shuffled influencer order decides the new state.  Nodes that do not move
+        through contact try their automatic transitions, again with one draw per node.
+        Meant for categorical dimensions.
+
+        :param nodes: the nodes to update
+        :return: an array with the next state of each node in param:nodes as its rows
+        '''
+        m = len(nodes)
+        rows, cols, mask_slots = self._influence_edges(nodes, sample=True)
+        model = self.compile_transmission()
+        contact_p, contact_to, auto_cum, auto_to = model['contact_p'], model['contact_to'], model['auto_cum'], \
+            model['auto_to']
+
+        # The node itself comes last in its influencer order, if selfloops are enforced.
+        keys = self.rng.random(len(rows))
+        if self.settings.selfloops:
+            rows = np.concatenate([rows, np.arange(m)])
+            cols = np.concatenate([cols, [self.node_index[u] for u in nodes]]).astype(np.intp)
+            mask_slots = np.concatenate([mask_slots, [self.mask_store.slots[u][u] for u in nodes]]).astype(np.intp)
+            keys = np.concatenate([keys, np.full(m, 2.)])
+        views = self._influence_values(cols, mask_slots)
+        has_nbrs = np.bincount(rows, minlength=m) > 0
+
+        next_state = self.states[[self.node_index[u] for u in nodes]]
+        for k in range(self.settings.num_dimensions):
+            curr = next_state[:, k].copy()
+            seen = views[:, k]
+            p = np.where(seen >= 0, contact_p[curr[rows], seen], 0.)
+            to = np.where(seen >= 0, contact_to[curr[rows], seen], -1)
+            live = p > 0
+
+            # Log-probability of escaping every contact leading to each state
+            with np.errstate(divide='ignore'):
+                escape = sparse.csr_matrix((np.log1p(-p[live]), (rows[live], to[live])),
+                                           shape=(m, contact_p.shape[0])).toarray()
+            outcomes = (escape < 0).sum(axis=1)
+
+            # Contacts that can only lead to one state: one draw per node
+            moved = (outcomes == 1) & (self.rng.random(m) < -np.expm1(escape.sum(axis=1)))
+            curr[moved] = escape[moved].argmin(axis=1)
+
+            # Contacts that can lead to several states: flip each contact's coin, and the first success wins
+            mixed = (outcomes > 1)[rows] & live
+            if mixed.any():
+                hit = np.flatnonzero(mixed)
+                hit = hit[self.rng.random(len(hit)) < p[hit]]
+                hit = hit[np.lexsort((keys[hit], rows[hit]))]
+                first = hit[np.unique(rows[hit], return_index=True)[1]]
+                curr[rows[first]] = to[first]
+                moved[rows[first]] = True
+
+            # Nodes that did not move through contact try their automatic transitions in order.
+            state = next_state[:, k]
+            j = (self.rng.random(m)[:, None] >= auto_cum[state]).sum(axis=1)
+            auto = ~moved & (j < auto_cum.shape[1])
+            curr[auto] = auto_to[state[auto], j[auto]]
+
+            # Nodes without influencers keep their current state.
+            next_state[:, k] = np.where(has_nbrs, curr, state)
+        return next_state
+
+    def run_events(self, duration):
+        '''
+        Simulate the 'transmission' update method in continuous time, one event at a time (Gillespie's method),
+        until self.clock has advanced by duration.
+        Each transition probability p is read as the chance the transition fires within one unit of time, i.e. as
+        the rate -log(1 - p).  A node's contact rate into a state is the sum over the influencers it sees in
+        contagious states, and contact and automatic transitions compete.  Only nodes that can actually change are
+        in the event queue, and an event reschedules just the changed node and the nodes it influences, so it costs
+        time proportional to their degrees.  Every neighbor a node can see influences it; 'num_influencers' and the
+        confidence bound do not apply.  As in update(), nodes without influencers do not change.
+        The queue is kept between calls, and is rebuilt if the topology, masks, states or transmission model
+        changed in between.
+
+        :param duration: the length of time to simulate
+        :return: a list of (time, node, dimension, new value) tuples, one per event, in order
+        '''
+        events = self._event_queue()
+        end = self.clock + duration
+        heap, version = events['heap'], events['version']
+        out, contact_p = self.get_adjacency(), events['model']['contact_p']
+
+        ret = []
+        while heap and heap[0][0] <= end:
+            t, v, j, k = heapq.heappop(heap)
+            if v != version[j, k]:
+                continue
+            self.clock = t
+
+            # Pick the transition that fired in proportion to the rates
+            targets, rates = self._event_rates(j, k)
+            if np.isinf(rates).any():
+                rates = np.isinf(rates).astype(np.float64)
+            pick = np.searchsorted(np.cumsum(rates), self.rng.random() * rates.sum(), side='right')
+            new = targets[min(pick, len(targets) - 1)]
+            old, self.states[j, k] = self.states[j, k], new
+            ret.append((t, self.node_list[j], k, self.categories[new]))
+
+            # Only this node and the nodes it influences can have new rates, and only if it was or is contagious to them.
+            nbrs = out.indices[out.indptr[j]:out.indptr[j + 1]]
+            nbrs = nbrs[(contact_p[self.states[nbrs, k], old] > 0) | (contact_p[self.states[nbrs, k], new] > 0)]
+            for i in np.append(nbrs[nbrs != j], j):
+                self._schedule_event(i, k)
+
+        self.clock = end
+        events['states'] = self.states.copy()
+        return ret
+
+    def _event_queue(self):
+        '''
+        Return the continuous-time event queue, rebuilding it if anything it depends on changed since it was built.
+
+        :return: a dict holding the heap of (time, version, row, dimension) entries and the current version of
+                 each (row, dimension) pair; heap entries with an older version are stale
+        '''
+        events = self._events
+        model = self.compile_transmission()
+        if events is not None and events['topology'] == self.topology_version and events['model'] is model and \
+                events['masks'] == self.mask_store.version and np.array_equal(events['states'], self.states):
+            return events
+
+        # Total rates of every (row, dimension) pair at once, summed over the same influencers as _event_rates()
+        n, K = self.states.shape
+        csc = self.get_adjacency(inbound=True)
+        cols = np.repeat(np.arange(n), np.diff(csc.indptr))
+        keep = csc.indices != cols
+        rows, cols, slots = csc.indices[keep], cols[keep], self.get_influence_slots()[keep]
+        if self.settings.selfloops:
+            rows, cols = np.concatenate([rows, np.arange(n)]), np.concatenate([cols, np.arange(n)])
+            slots = np.concatenate([slots, [self.mask_store.slots[u][u] for u in self.node_list]]).astype(np.intp)
+        seen = self._influence_values(rows, slots)
+        has_nbrs = np.bincount(cols, minlength=n) > 0
+
+        heap = []
+        for k in range(K):
+            curr = self.states[:, k]
+            with np.errstate(divide='ignore'):
+                contact = -np.log1p(-np.where(seen[:, k] >= 0, model['contact_p'][curr[cols], seen[:, k]], 0.))
+                total = np.bincount(cols, weights=contact, minlength=n) - np.log1p(-model['auto_p'][curr]).sum(axis=1)
+            live = np.flatnonzero(has_nbrs & (total > 0))
+            times = self.clock + self.rng.exponential(1. / total[live])
+            heap.extend(zip(times.tolist(), [1] * len(live), live.tolist(), [k] * len(live)))
+        heapq.heapify(heap)
+
+        self._events = {'topology': self.topology_version, 'model': model, 'masks': self.mask_store.version,
+                        'states': self.states.copy(), 'heap': heap, 'version': np.ones((n, K), dtype=np.int64)}
+        return self._events
+
+    def _event_rates(self, j, k):
+        '''
+        Compute the rate of every transition open to dimension k of the node in state matrix row j.
+
+        :param j: the state matrix row of the node
+        :param k: the dimension
+        :return: an array of target states and an aligned array of rates; both are empty if the node has no
+                 influencers
+        '''
+        model = self._transmission
+        csc, slots = self.get_adjacency(inbound=True), self.get_influence_slots()
+        lo, hi = csc.indptr[j], csc.indptr[j + 1]
+        rows, slots = csc.indices[lo:hi], slots[lo:hi]
+        rows, slots = rows[rows != j], slots[rows != j]
+        if self.settings.selfloops:
+            u = self.node_list[j]
+            rows, slots = np.append(rows, j), np.append(slots, self.mask_store.slots[u][u])
+        if not len(rows):
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        curr = self.states[j, k]
+        seen = self._influence_values(rows, slots)[:, k]
+        seen = seen[seen >= 0]
+        with np.errstate(divide='ignore'):
+            rates = -np.log1p(-np.concatenate([model['contact_p'][curr, seen], model['auto_p'][curr]]))
+        targets = np.concatenate([model['contact_to'][curr, seen], model['auto_to'][curr]])
+        return targets[rates > 0], rates[rates > 0]
+
+    def _schedule_event(self, j, k):
+        '''
+        Schedule the next event of dimension k of the node in state matrix row j, replacing any earlier one.
+
+        :param j: the state matrix row of the node
+        :param k: the dimension
+        :return: None
+        '''
+        events = self._events
+        events['version'][j, k] += 1
+        total = self._event_rates(j, k)[1].sum()
+        if total > 0:
+            heapq.heappush(events['heap'], (self.clock + self.rng.exponential(1. / total),
+                                            events['version'][j, k], j, k))
+
+    def nextstate_average(self, u, nbrs=None):
+        if self.settings.update_method == 'average':
+            local_avg = self.get_local_average(u, nbrs=nbrs)
+        elif self.settings.update_method == 'wt. avg.':
+            local_avg = self.get_local_average(u, weighted=True, nbrs=nbrs)
+        myvals = self.get_state(u)
+        K = self.settings.num_dimensions
         next_state = []
-        t = self.prop('types')[u]
+        t = self.settings.types[u]
         for k in range(K):
             diff = local_avg[k] - myvals[k]
             if (t in CONFORMING and local_avg[k] * myvals[k] < 0) or\
                (t in REBELLING and local_avg[k] * myvals[k] >= 0):
                 if self._has_property('resistance'):
-                    if abs(local_avg[k]) > self.prop('resistance')[u]:
-                        next_state.append(myvals[k] + (diff * self.prop('gravity')))
+                    if abs(local_avg[k]) > self.settings.resistance[u]:
+                        next_state.append(myvals[k] + (diff * self.settings.gravity))
                     else:
                         next_state.append(myvals[k])
                 else:
                     if t in CONFORMING:
-                        next_state.append(myvals[k] + (diff * self.prop('gravity')))
+                        next_state.append(myvals[k] + (diff * self.settings.gravity))
                     else:
-                        next_state.append(0 - (myvals[k] + (diff * self.prop('gravity'))))
+                        next_state.append(0 - (myvals[k] + (diff * self.settings.gravity)))
             else:
-                next_state.append(myvals[k] + (diff * self.prop('gravity')))
+                next_state.append(myvals[k] + (diff * self.settings.gravity))
 
-        if self.prop('dimensions') == 'continuous':
+        if self.settings.dimensions == 'continuous':
             ret = []
             for val in next_state:
                 if val < -1:
@@ -1578,12 +2219,12 @@ class SocialNetwork:
                     ret.append(round(val, 2))
             return ret
 
-        elif self.prop('dimensions') == 'binary':
+        elif self.settings.dimensions == 'binary':
             ret = []
             for i in range(len(next_state)):
-                if next_state[i] == 0 and self.prop('gravity') >= 0:
+                if next_state[i] == 0 and self.settings.gravity >= 0:
                     ret.append(myvals[i])
-                elif next_state[i] == 0 and self.prop('gravity') < 0:
+                elif next_state[i] == 0 and self.settings.gravity < 0:
                     ret.append(0 - myvals[i])
                 elif next_state[i] < 0:
                     ret.append(-1)
@@ -1591,6 +2232,227 @@ class SocialNetwork:
                     ret.append(1)
             return ret
 
+    def _influence_edges(self, nodes, sample=False):
+        '''
+        Collect the edges through which several nodes can be influenced, read from the inbound adjacency snapshot.
+        Self-edges are left out, and if a confidence bound is in use, so are neighbors that do not produce enough
+        reward.  With param:sample, each node keeps at most 'num_influencers' of its edges, chosen uniformly at
+        random without replacement for all nodes at once, as get_influencers() does for one node.
+
+        :param nodes: the influenced nodes
+        :param sample: whether to sample the influencers of nodes with more than 'num_influencers' of them
+        :return: three aligned arrays, grouped by influenced node: the position in param:nodes of each edge's
+                 influenced node, the state matrix row of its influencer, and the mask slot of the influenced node's
+                 view of the influencer
+        '''
+        sel = np.array([self.node_index[u] for u in nodes], dtype=np.intp)
+        csc = self.get_adjacency(inbound=True)
+        rows, pos = csr_gather(csc.indptr, sel)
+        cols = csc.indices[pos]
+        keep = cols != sel[rows]
+        rows, cols, pos = rows[keep], cols[keep], pos[keep]
+        mask_slots = self.get_influence_slots()[pos]
+
+        # If using confidence bound, trim out neighbors who do not produce enough reward
+        if self.settings.confidence_dist != '-':
+            confidence = self.settings.confidence
+            us = [nodes[i] for i in rows]
+            keep = self.reward_many(us, [self.node_list[j] for j in cols]) >= 1 - np.array([confidence[u] for u in us])
+            rows, cols, mask_slots = rows[keep], cols[keep], mask_slots[keep]
+
+        # Shuffle the edges within each node that has too many, and keep the first 'num_influencers' of each,
+        # leaving the kept edges in their original order
+        num = self.settings.num_influencers
+        if sample and len(nodes) and np.bincount(rows, minlength=len(nodes)).max() > num:
+            order = np.lexsort((self.rng.random(len(rows)), rows))
+            rank = np.arange(len(rows)) - np.searchsorted(rows[order], rows[order])
+            keep = np.sort(order[rank < num])
+            rows, cols, mask_slots = rows[keep], cols[keep], mask_slots[keep]
+
+        return rows, cols, mask_slots
+
+    def nextstates_average(self, nodes, weighted=False):
+        '''
+        Compute the next states of several nodes at once under the 'average' and 'wt. avg.' update methods.
+        The result is the same as calling nextstate_average() on each node (or, where influencers are sampled, is
+        drawn the same way), but every local average comes out of one sparse (influence matrix x state matrix)
+        product, and the conformity, resistance, gravity, and clipping rules are applied to whole arrays.
+
+        :param nodes: the nodes to update
+        :param weighted: whether to weight influencers by their normalized edge weights
+        :return: an array with the next state of each node in param:nodes as its rows
+        '''
+        K = self.settings.num_dimensions
+        m, n = len(nodes), len(self.node_list)
+        weighted = weighted and self.settings.weight_dist != '-'
+
+        # Collect the influence edges (updating node, influencer) along with their weights and mask slots.
+        rows, cols, mask_slots = self._influence_edges(nodes, sample=True)
+        if self.settings.selfloops:
+            rows = np.concatenate([rows, np.arange(m)])
+            cols = np.concatenate([cols, [self.node_index[u] for u in nodes]]).astype(np.intp)
+            mask_slots = np.concatenate([mask_slots, [self.mask_store.slots[u][u] for u in nodes]]).astype(np.intp)
+        if weighted and len(rows):
+            W = self.pair_weights.tocsr()
+            targets = np.array([self.node_index[u] for u in nodes], dtype=np.intp)[rows]
+            w = np.asarray(W[targets, cols]).ravel() / np.asarray(W.sum(axis=1)).ravel()[targets]
+        else:
+            w = np.ones(len(rows))
+        vis = self.mask_store.gather(mask_slots).reshape(len(rows), K)
+
+        # Sum each node's (masked) view of its influencers.  Hidden values count as zeroes.
+        if vis.all():
+            total = sparse.csr_matrix((w, (rows, cols)), shape=(m, n)) @ self.states
+        else:
+            total = np.column_stack([sparse.csr_matrix((w * vis[:, k], (rows, cols)), shape=(m, n)) @ self.states[:, k]
+                                     for k in range(K)]).reshape(m, K)
+        wsum = np.bincount(rows, weights=w, minlength=m)
+        has_nbrs = np.bincount(rows, minlength=m) > 0
+        local_avg = total / np.where(has_nbrs, wsum, 1.)[:, None]
+        if weighted:
+            local_avg = np.round(local_avg, 2)
+
+        myvals = self.states[[self.node_index[u] for u in nodes]]
+        types = self.settings.types
+        conforming = np.array([types[u] in CONFORMING for u in nodes], dtype=bool)[:, None]
+        rebelling = np.array([types[u] in REBELLING for u in nodes], dtype=bool)[:, None]
+        gravity = self.settings.gravity
+
+        # Apply the same conformity, resistance, and gravity rules as nextstate_average().
+        moved = myvals + (local_avg - myvals) * gravity
+        flip = (conforming & (local_avg * myvals < 0)) | (rebelling & (local_avg * myvals >= 0))
+        if self._has_property('resistance'):
+            resistance = np.array([self.settings.resistance[u] for u in nodes], dtype=np.float64)[:, None]
+            next_state = np.where(flip & (np.abs(local_avg) <= resistance), myvals, moved)
+        else:
+            next_state = np.where(flip & ~conforming, -moved, moved)
+
+        if self.settings.dimensions == 'continuous':
+            next_state = np.where(next_state < -1, -1., np.where(next_state > 1, 1., np.round(next_state, 2)))
+        elif self.settings.dimensions == 'binary':
+            next_state = np.where(next_state == 0, myvals if gravity >= 0 else -myvals,
+                                  np.where(next_state < 0, -1., 1.))
+
+        # Nodes without influencers keep their current state.
+        return np.where(has_nbrs[:, None], next_state, myvals)
+
+    def _influence_values(self, cols, mask_slots):
+        '''
+        Return what is seen through a set of influence edges, as get_view() would show it: hidden values are 0.
+        Categorical values are given as integer codes, and hidden ones get the code of the value 0, or -1 if 0 is not
+        a known category.
+
+        :param cols: the state matrix row of each edge's influencer
+        :param mask_slots: the mask slot of each edge
+        :return: an array with one row of values per edge
+        '''
+        vis = self.mask_store.gather(mask_slots).reshape(len(cols), self.settings.num_dimensions)
+        hidden = 0
+        if self.categories is not None:
+            hidden = self.categories.index(0) if 0 in self.categories else -1
+        return np.where(vis, self.states[cols], hidden)
+
+    def _store_codes(self, vals):
+        '''
+        Turn values produced by _influence_values() back into storable state values.  The only change is to
+        register the categorical value 0 if a hidden value was adopted.
+
+        :param vals: an array of state values
+        :return: the same array
+        '''
+        if self.categories is not None and (vals == -1).any():
+            vals[vals == -1] = self._category_code(0)
+        return vals
+
+    def nextstates_voter(self, nodes, q=None):
+        '''
+        Compute the next states of several nodes at once under the 'voter' and 'qvoter' update methods.
+        With q = None, this gives the same result as calling nextstate_voter() on each node: a node adopts a value
+        wherever all of its influencers (itself included, if selfloops are enforced) agree.  Otherwise each node
+        samples q of its influencers with replacement, as in nextstate_qvoter().  The samples are drawn for all
+        nodes at once from the inbound adjacency snapshot.
+
+        :param nodes: the nodes to update
+        :param q: the number of influencers to sample, or None to use all of them
+        :return: an array with the next state of each node in param:nodes as its rows
+        '''
+        m = len(nodes)
+        rows, cols, mask_slots = self._influence_edges(nodes, sample=True)
+        if q is None and self.settings.selfloops:
+            rows = np.concatenate([rows, np.arange(m)])
+            cols = np.concatenate([cols, [self.node_index[u] for u in nodes]]).astype(np.intp)
+            mask_slots = np.concatenate([mask_slots, [self.mask_store.slots[u][u] for u in nodes]]).astype(np.intp)
+            order = np.argsort(rows, kind='stable')
+            rows, cols, mask_slots = rows[order], cols[order], mask_slots[order]
+        views = self._influence_values(cols, mask_slots)
+
+        # Each node's influencers occupy one contiguous run of the edge arrays.
+        counts = np.bincount(rows, minlength=m)
+        has_nbrs = counts > 0
+        starts = (np.cumsum(counts) - counts)[has_nbrs]
+        if q is None:
+            lo = np.minimum.reduceat(views, starts, axis=0)
+            agree, pick = lo == np.maximum.reduceat(views, starts, axis=0), lo
+        else:
+            draws = starts[:, None] + (self.rng.random((len(starts), q)) * counts[has_nbrs][:, None]).astype(np.intp)
+            panel = views[draws]
+            agree, pick = (panel == panel[:, :1]).all(axis=1), panel[:, 0]
+
+        # Nodes without influencers keep their current state.
+        next_state = self.states[[self.node_index[u] for u in nodes]]
+        next_state[has_nbrs] = np.where(agree, pick, next_state[has_nbrs])
+        return self._store_codes(next_state)
+
+    def nextstates_vote(self, nodes, plurality=False):
+        '''
+        Compute the next states of several nodes at once under the 'majority' and 'plurality' update methods.
+        Each dimension's values are one-hot encoded, and every node's vote counts come out of one sparse
+        (influence edge x one-hot) product.  The winners are picked with the same rules as nextstate_majority() and
+        nextstate_plurality(), including their quirks:
+        - a value wins a majority if its count is more than half the number of distinct values seen;
+        - ties go to the value seen first (plurality) or last (majority) in the node's shuffled influencer order,
+          where the node itself, if selfloops are enforced, comes last.
+        Meant for binary and categorical dimensions.
+
+        :param nodes: the nodes to update
+        :param plurality: whether to use the plurality rule instead of the majority rule
+        :return: an array with the next state of each node in param:nodes as its rows
+        '''
+        m = len(nodes)
+        rows, cols, mask_slots = self._influence_edges(nodes, sample=True)
+
+        # Shuffle each node's influencers by giving them random keys; the node itself always comes last.
+        keys = self.rng.random(len(rows))
+        if self.settings.selfloops:
+            rows = np.concatenate([rows, np.arange(m)])
+            cols = np.concatenate([cols, [self.node_index[u] for u in nodes]]).astype(np.intp)
+            mask_slots = np.concatenate([mask_slots, [self.mask_store.slots[u][u] for u in nodes]]).astype(np.intp)
+            keys = np.concatenate([keys, np.full(m, 2.)])
+        views = self._influence_values(cols, mask_slots)
+
+        # Nodes without influencers keep their current state.
+        next_state = self.states[[self.node_index[u] for u in nodes]]
+        if not len(rows):
+            return self._store_codes(next_state)
+        for k in range(self.settings.num_dimensions):
+            vals, codes = np.unique(views[:, k], return_inverse=True)
+            counts = sparse.csr_matrix((np.ones(len(rows)), (rows, codes)), shape=(m, len(vals))).toarray()
+
+            # The position of each value's first appearance in each node's influencer order
+            first = np.full(counts.shape, np.inf)
+            np.minimum.at(first, (rows, codes), keys)
+
+            if plurality:
+                best = counts == counts.max(axis=1, keepdims=True)
+                winner = np.where(best & (counts > 0), first, np.inf).argmin(axis=1)
+                won = counts.max(axis=1) > 0
+            else:
+                best = counts * 2 > (counts > 0).sum(axis=1, keepdims=True)
+                winner = np.where(best, first, -np.inf).argmax(axis=1)
+                won = best.any(axis=1)
+            next_state[:, k] = np.where(won, vals[winner], next_state[:, k])
+        return self._store_codes(next_state)
+
     def simple_average(self, d):
         '''
 
@@ -1598,7 +2460,7 @@ class SocialNetwork:
         :return:
         '''
         ret = []
-        for k in range(self.prop('num_dimensions')):
+        for k in range(self.settings.num_dimensions):
             vec = [d[i][k] for i in d]
             if not vec:
                 ret.append(0.)
@@ -1614,7 +2476,7 @@ class SocialNetwork:
         :return:
         '''
         ret = []
-        for k in range(self.prop('num_dimensions')):
+        for k in range(self.settings.num_dimensions):
             total = 0
             for key in d:
                 total += d[key][k] * w[key]
@@ -1623,40 +2485,205 @@ class SocialNetwork:
 
     def update(self):
         '''
+        Update the states of up to num_nodes_update random nodes, each chosen with probability p_update.  Under the
+        'transmission' update method with 'continuous' timing, time instead advances by one unit of event-driven
+        transmissions over the whole network, and num_nodes_update and p_update do not apply.
 
         :return:
         '''
-        if self.prop('p_update') == 0:
+        start = self.states.copy()
+        self.diagnostics = {'max_delta': 0., 'num_changed': 0, 'num_rewired': 0}
+        # print('Before: ', self.prop('diffusion_space'))
+        upd = self.settings.update_method
+        if upd == 'transmission' and self.categories is not None and self.settings.timing == 'continuous':
+            self.run_events(1.)
+            self._record_changes(start)
+            return
+
+        if self.settings.p_update == 0:
             return []
-        numupdates = min(self.prop('num_nodes_update'), self.prop('n'))
-        mynodes = list(self.nodes())
-        if numupdates < len(mynodes):
-            random.shuffle(mynodes)
+        # Pick the updating nodes with one permutation and one batch of coin flips
+        mynodes = self.get_n_random_nodes(self.settings.num_nodes_update)
+        mynodes = [node for node, keep in zip(mynodes, self.rng.random(len(mynodes)) < self.settings.p_update) if keep]
+
+        # Nodes known to keep their state are skipped, so that late steps only do work where something changed.
+        self._unsettle()
+
+        # 'sync' updates every node from the states before the update.  'async' updates one node at a time in random
+        # order.  'block' updates one color class at a time in random order; no two nodes of a class influence each
+        # other, so each class gives the same result as updating its nodes one at a time.
+        order = self.settings.update_order
+        if order == 'sync':
+            batches = [mynodes]
+        elif order == 'async':
+            batches = [[mynodes[i]] for i in self.rng.permutation(len(mynodes))]
+        else:
+            colors = self.get_coloring()[[self.node_index[node] for node in mynodes]]
+            batches = [[node for node, c in zip(mynodes, colors) if c == color]
+                       for color in self.rng.permutation(np.unique(colors))]
+        for batch in batches:
+            self._update_batch(batch, upd)
+        # print('After: ', self.prop('diffusion_space'))
+        self._record_changes(start)
 
-        # print('Before: ', self.prop('diffusion_space'))
-        upd = self.prop('update_method')
-        next_states = {}
-        for i, node in enumerate(mynodes):
-            if i >= numupdates:
-                break
-            if coin_flip(self.prop('p_update')):
-                if not self.get_influencers(node):
-                    next_states[node] = self.prop('diffusion_space')[node]
+    def _update_batch(self, mynodes, upd):
+        '''
+        Update a set of nodes at once, computing all of their next states before changing any of them.  Nodes that are
+        settled are skipped.
+
+        :param mynodes: the nodes to update
+        :param upd: the update method
+        :return: None
+        '''
+        mynodes = [node for node in mynodes if not self._settled[self.node_index[node]]]
+        before = self.states[[self.node_index[node] for node in mynodes]]
+
+        # Averaging, voter, vote counting, and transmission rules can be computed for every updating node at once, with
+        # influencers sampled from the adjacency snapshot.
+        next_states = None
+        if upd in ['average', 'wt. avg.'] and self.settings.dimensions != 'categorical':
+            next_states = self.nextstates_average(mynodes, weighted=(upd == 'wt. avg.'))
+        elif upd in ['voter', 'qvoter']:
+            next_states = self.nextstates_voter(mynodes, q=self.settings.q if upd == 'qvoter' else None)
+        elif upd in ['majority', 'plurality'] and self.settings.dimensions != 'continuous':
+            next_states = self.nextstates_vote(mynodes, plurality=(upd == 'plurality'))
+        elif upd == 'transmission' and self.categories is not None:
+            next_states = self.nextstates_transmission(mynodes)
+        if next_states is not None:
+            self.states[[self.node_index[node] for node in mynodes]] = next_states
+        else:
+            # Otherwise, each node's influencers are drawn once and used for both the emptiness check and the update
+            next_states = {}
+            for node in mynodes:
+                nbrs = self.get_influencers(node)
+                if not nbrs:
+                    next_states[node] = self.get_state(node)
                 elif upd in ['average', 'wt. avg.']:
-                    next_states[node] = self.nextstate_average(node)
+                    next_states[node] = self.nextstate_average(node, nbrs)
                 elif upd == 'voter':
-                    next_states[node] = self.nextstate_voter(node)
+                    next_states[node] = self.nextstate_voter(node, nbrs)
+                elif upd == 'qvoter':
+                    next_states[node] = self.nextstate_qvoter(node, nbrs)
                 elif upd == 'majority':
-                    next_states[node] = self.nextstate_majority(node)
+                    next_states[node] = self.nextstate_majority(node, nbrs)
                 elif upd == 'plurality':
-                    next_states[node] = self.nextstate_plurality(node)
+                    next_states[node] = self.nextstate_plurality(node, nbrs)
                 elif upd == 'transmission':
-                    next_states[node] = self.next_state_transmission(node)
+                    next_states[node] = self.next_state_transmission(node, nbrs)
 
-        for node in next_states:
-            self.instance.graph['diffusion_space'][node] = next_states[node]
+            for node in next_states:
+                self.set_state(node, next_states[node])
 
-        # print('After: ', self.prop('diffusion_space'))
+        # Nodes that kept their state, and would keep it on every re-evaluation, are settled until something changes.
+        # The nodes influenced by a node that changed have to be looked at again.
+        rows = np.array([self.node_index[node] for node in mynodes], dtype=np.intp)
+        same = (before == self.states[rows]).all(axis=1)
+        self._settled[rows[same]] = self._keeps_state([node for node, s in zip(mynodes, same) if s], upd)
+        csr = self.get_adjacency()
+        self._settled[csr.indices[csr_gather(csr.indptr, rows[~same])[1]]] = False
+
+    def _record_changes(self, before):
+        '''
+        Record in self.diagnostics how far the states moved from param:before.  Categorical values count as moving
+        a distance of 1 whenever they change.
+
+        :param before: a copy of the state matrix from before the change
+        :return: None
+        '''
+        delta = np.abs(self.states - before) if self.categories is None else (self.states != before).astype(np.float64)
+        self.diagnostics['max_delta'] = float(delta.max()) if delta.size else 0.
+        self.diagnostics['num_changed'] = int((delta > 0).any(axis=1).sum())
+
+    def is_absorbed(self):
+        '''
+        Check whether the update method can never change any state again, whatever random draws it makes, as long
+        as the topology and masks stay the same.  Under the averaging, voter and voting rules this is the case when
+        every node's influencers all show its own state (and no node rebels, for the averaging rules).  Under
+        'transmission' it is the case when no node has a transition with a positive probability.
+
+        :return: True if the network is in an absorbing state, otherwise False
+        '''
+        upd = self.settings.update_method
+        if upd in ['average', 'wt. avg.'] and any(t in REBELLING for t in self.settings.types.values()):
+            return False
+        return bool(self._is_inert(list(self.node_list), upd).all())
+
+    def _unsettle(self):
+        '''
+        Bring the record of settled nodes up to date.  A node stops being settled when its own state or the state
+        of one of its influencers changes, when an edge it is on is added or removed, or when its masks change, and
+        every node stops being settled when a property changes.  Only the changes since the last call are looked at.
+
+        :return: a boolean array over state matrix rows, True for the nodes known to keep their state
+        '''
+        since, n = self._settled_since, len(self.node_list)
+        if since is None or since['settings'] is not self.settings or since['states'].shape != self.states.shape:
+            self._settled = np.zeros(n, dtype=bool)
+        else:
+            changed = np.flatnonzero((since['states'] != self.states).any(axis=1))
+            csr = self.get_adjacency()
+            self._settled[changed] = False
+            self._settled[csr.indices[csr_gather(csr.indptr, changed)[1]]] = False
+            touched = [self.node_index[u] for u in self._touched | self.mask_store.changed if u in self.node_index]
+            self._settled[touched] = False
+
+        self._touched.clear()
+        self.mask_store.changed.clear()
+        self._settled_since = {'settings': self.settings, 'states': self.states.copy()}
+        return self._settled
+
+    def _keeps_state(self, nodes, upd):
+        '''
+        Check which nodes would keep their current state every time they are updated, given that they just did.
+        Under 'average', 'wt. avg.' and 'voter', this holds for nodes that do not sample their influencers, since
+        their update is deterministic.  Under the voting rules it holds for nodes whose influencers all show their
+        own state, and under 'transmission' for nodes that have no transition with a positive probability.
+
+        :param nodes: nodes that kept their state in the last update
+        :param upd: the update method
+        :return: a boolean array, True for the nodes of param:nodes that can be skipped until something changes
+        '''
+        ret = np.zeros(len(nodes), dtype=bool)
+        if upd in ['average', 'wt. avg.', 'voter']:
+            sel = np.array([self.node_index[u] for u in nodes], dtype=np.intp)
+            csc = self.get_adjacency(inbound=True)
+            ret = np.diff(csc.indptr)[sel] - (csc.diagonal()[sel] > 0) <= self.settings.num_influencers
+            if upd != 'voter' or ret.all():
+                return ret
+        return ret | self._is_inert(nodes, upd)
+
+    def _is_inert(self, nodes, upd):
+        '''
+        Check which nodes cannot change state under the update method, whatever random draws it makes: nodes
+        without influencers, nodes whose influencers all show their own state, or under 'transmission', nodes that
+        have no transition with a positive probability.
+
+        :param nodes: the nodes to check
+        :param upd: the update method
+        :return: a boolean array, True for the nodes of param:nodes that cannot change state
+        '''
+        m = len(nodes)
+        sel = np.array([self.node_index[u] for u in nodes], dtype=np.intp)
+
+        # Look at what each node sees through its influencers, itself included if selfloops are enforced.
+        rows, cols, mask_slots = self._influence_edges(nodes)
+        if self.settings.selfloops:
+            rows = np.concatenate([rows, np.arange(m)])
+            cols = np.concatenate([cols, sel]).astype(np.intp)
+            mask_slots = np.concatenate([mask_slots, [self.mask_store.slots[u][u] for u in nodes]]).astype(np.intp)
+        views, own = self._influence_values(cols, mask_slots), self.states[sel]
+
+        if upd == 'transmission':
+            if self.categories is None:
+                return np.zeros(m, dtype=bool)
+            model = self.compile_transmission()
+            contact = np.where(views >= 0, model['contact_p'][own[rows], views], 0.) > 0
+            blocked = np.bincount(rows, weights=contact.any(axis=1), minlength=m) > 0
+            auto = model['auto_p'][own].sum(axis=(1, 2)) > 0
+            return (np.bincount(rows, minlength=m) == 0) | ~(blocked | auto)
+
+        disagree = (views != own[rows]).any(axis=1)
+        return np.bincount(rows, weights=disagree, minlength=m) == 0
 
     def reward(self, u, v, raw=False):
         '''
@@ -1670,15 +2697,15 @@ class SocialNetwork:
 
         # Get distance between u and v, taking masks into account
         if raw:
-            d = dist(self.prop('diffusion_space')[u], self.prop('diffusion_space')[v],
-                     self.prop('distance'))
+            d = dist(self.get_state(u), self.get_state(v),
+                     self.settings.distance)
         else:
-            d = dist(self.prop('diffusion_space')[u], self.get_view(u, v),
-                     self.prop('distance'))
+            d = dist(self.get_state(u), self.get_view(u, v),
+                     self.settings.distance)
 
         # Get the % similarity that maximizes u's reward
         # print(self.prop('agent_models'))
-        maxval = self.prop('agent_models')[self.prop('types')[u]]['max_sim']
+        maxval = self.settings.agent_models[self.settings.types[u]]['max_sim']
 
         # If totally homophilic, return 1 - distance
         if maxval == 1.:
@@ -1696,6 +2723,71 @@ class SocialNetwork:
             p = (maxval - d) / maxval
             return 1 - p
 
+    def reward_many(self, us, vs, raw=False):
+        '''
+        Calculate the reward each node in us gets from the corresponding node in vs.  Gives the same values as
+        calling reward() on every pair, but computes all of them in one vectorized pass.
+
+        :param us: The receiving nodes, or a single receiving node shared by every pair
+        :param vs: The nodes providing the reward
+        :param raw: Whether to take masking and connectedness into account
+        :return: array of reward values in the range [0, 1]
+        '''
+        vs = list(vs)
+        us = [us] * len(vs) if np.ndim(us) == 0 else list(us)
+        a = self.states[np.array([self.node_index[u] for u in us], dtype=np.intp)]
+        b = self.states[np.array([self.node_index[v] for v in vs], dtype=np.intp)]
+
+        # Only dimensions that u can see (and, as in dist(), that are nonzero) are compared.
+        if raw:
+            visible = np.ones(a.shape, dtype=bool)
+        else:
+            slots = self._view_slots(us, vs)
+            visible = np.zeros(a.shape, dtype=bool)
+            visible[slots >= 0] = self.mask_store.gather(slots[slots >= 0])
+        if self.categories is None:
+            visible &= b != 0
+        return self._reward_from_distance(us, dist_many(a, b, visible, self.settings.distance))
+
+    def _reward_from_distance(self, us, d):
+        '''
+        Turn the distance each node in us sees into its reward, according to its agent model.
+
+        :param us: The receiving nodes
+        :param d: array of distances, one per node in us
+        :return: array of reward values in the range [0, 1]
+        '''
+        # Get the % similarity that maximizes each u's reward
+        models, types = self.settings.agent_models, self.settings.types
+        maxval = np.array([models[types[u]]['max_sim'] for u in us], dtype=np.float64)
+
+        # Totally homophilic: 1 - distance.  Totally heterophilic: distance.  Otherwise linear reward based on
+        # max_sim and the boundaries [0, 1].
+        with np.errstate(divide='ignore', invalid='ignore'):
+            linear = np.where(d >= maxval, 1 - (d - maxval) / (1 - maxval), 1 - (maxval - d) / maxval)
+        return np.where(maxval == 1., 1 - d, np.where(maxval == 0., d, linear))
+
+    def _view_slots(self, us, vs):
+        '''
+        Find the mask slot holding each u's view of the corresponding v.
+
+        :param us: the viewing nodes
+        :param vs: the viewed nodes
+        :return: array of mask slots, with -1 wherever u is not connected to v and so sees nothing
+        '''
+        # With a current adjacency snapshot, all pairs can be looked up at once.
+        if self._adjacency_is_current():
+            n = len(self.node_list)
+            slots = self.get_influence_slots()
+            keys = self._adjacency['keys']
+            q = np.array([self.node_index[u] * n + self.node_index[v] for u, v in zip(us, vs)], dtype=np.int64)
+            pos = np.minimum(np.searchsorted(keys, q), max(len(keys) - 1, 0))
+            found = (keys[pos] == q) if len(keys) else np.zeros(len(q), dtype=bool)
+            return np.where(found, slots[pos] if len(keys) else -1, -1)
+
+        # Otherwise, u sees v exactly when u holds a mask for v.
+        return np.array([self.mask_store.slots.get(u, {}).get(v, -1) for u, v in zip(us, vs)], dtype=np.intp)
+
     def get_positions(self):
         '''
 
@@ -1719,58 +2811,212 @@ class SocialNetwork:
         return np.array(list(pos.values())).T if pos else None
 
     def get_weights(self):
-        d = {}
+        '''
+        Return the weight of every edge, keyed by (u, v), or by (u, v, label) in MultiGraphs and MultiDiGraphs.
+
+        :return: a dict of edge weights
+        '''
         if self.isgraph() or self.isdigraph():
-            for u, v in self.edges:
-                d[(u, v)] = self[u][v]['weight']
-        elif self.ismultigraph() or self.ismultidigraph():
-            for u, v, label in self.edges:
-                d[(u, v, label)] = self[u][v][label]['weight']
-        return d
+            return {(u, v): w for u, v, w in self.edges(data='weight')}
+        return {(u, v, label): w for u, v, label, w in self.edges(keys=True, data='weight')}
 
     def get_connections(self):
         '''
+        Pick random nodes and have each of them propose up to 'num_connections' new ties among its candidates, each
+        with probability 'p_connect'.  Every node proposes against the same topology, and the proposals are resolved
+        with _resolve_proposals() and added together with connect_many(), so the result does not depend on the
+        order in which nodes were picked.
 
-        :return:
+        :return: A list of edges added
         '''
-        if self.prop('p_connect') == 0:
+        if self.settings.p_connect == 0:
             return []
-        ret = []
-        allnodes = list(self.nodes())
-        mynodes = self.get_n_random_nodes(self.prop('num_nodes_connect'))
-        num_c = self.prop('num_connections')
+        mynodes = self.get_n_random_nodes(self.settings.num_nodes_connect)
+        num_c = self.settings.num_connections
+        rows, cols = [], []
         for node in mynodes:
-            possible = [i for i in allnodes if i not in self[node] and  i != node and
-                        self.reward(node, i) >= self.prop('thresh_connect')]
-            random.shuffle(possible)
-            possible = possible[:num_c]
-            for c in possible:
-                ret.extend(self.connect(node, c, p=self.prop('p_connect')))
-        return ret
+            if self.settings.connect_budget:
+                possible = self.sample_connection_candidates(node, num_c)
+            else:
+                possible = self.get_connection_candidates(node)
+                possible = possible[self.rng.choice(len(possible), min(num_c, len(possible)), replace=False)]
+            possible = possible[self.rng.random(len(possible)) < self.settings.p_connect]
+            rows.extend([self.node_index[node]] * len(possible))
+            cols.extend(possible)
+        directed = self.settings.directed
+        return self.connect_many(self._resolve_proposals(rows, cols, not directed or self.settings.symmetric))
+
+    def _resolve_proposals(self, rows, cols, mutual):
+        '''
+        Turn edge proposals made against the same topology into one batch to commit.  Repeated proposals count
+        once, and the batch is sorted by state matrix rows, so that it does not depend on the order in which the
+        proposals were made.
+
+        :param rows: node_index rows of the proposing nodes
+        :param cols: node_index rows of the nodes they propose ties to
+        :param mutual: whether (u, v) and (v, u) propose the same tie, as in undirected or symmetric graphs
+        :return: a list of (u, v) pairs
+        '''
+        rows, cols = np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)
+        if mutual:
+            rows, cols = np.minimum(rows, cols), np.maximum(rows, cols)
+        pairs = np.unique(np.column_stack((rows, cols)), axis=0)
+        return [(self.node_list[i], self.node_list[j]) for i, j in pairs]
+
+    def get_connection_candidates(self, u):
+        '''
+        Find the nodes u is not connected to whose reward passes 'thresh_connect', among the nodes the
+        'connect_candidates' property allows:
+        'all' considers every node in the network,
+        'two_hop' considers only the neighbors of u's neighbors (successors of its successors, in a directed graph),
+        enumerated in full from the adjacency snapshot rather than sampled, so that the cost grows with u's degree
+        squared rather than with the size of the network, and
+        'mixed' adds 'global_candidates' times as many nodes drawn at random from the whole network.
+        Under 'all', gives the same candidates as scoring every node with reward(), without scoring them one by one.
+        u's view of a node it holds no mask for is blank, so all of those nodes give u the same reward and pass or
+        fail together.  Only the nodes u can see without being connected to them (its predecessors, in a directed
+        graph) need to be scored individually.
+
+        :param u: the node looking for new connections
+        :return: array of node_index rows of the candidate nodes
+        '''
+        thresh = self.settings.thresh_connect
+        exclude = set(self[u])
+        exclude.add(u)
+
+        if self.settings.connect_candidates != 'all':
+            rows = self._connection_pool(u, exclude)
+            return rows[self._passes_connect(u, rows)]
+
+        # Score the nodes u can see
+        seen = [v for v in self.mask_store.slots.get(u, {}) if v not in exclude]
+        rows = np.array([self.node_index[v] for v, r in zip(seen, self.reward_many(u, seen)) if r >= thresh],
+                        dtype=np.intp)
+
+        # Every other node shares the reward of a blank view
+        if self._reward_from_distance([u], np.zeros(1))[0] >= thresh:
+            blank = np.ones(len(self.node_list), dtype=bool)
+            blank[[self.node_index[v] for v in exclude.union(seen)]] = False
+            rows = np.concatenate((rows, np.flatnonzero(blank)))
+        return np.sort(rows)
+
+    def sample_connection_candidates(self, u, num):
+        '''
+        Find up to param:num of the candidates get_connection_candidates() would give, without scoring them all.
+        Nodes are drawn at random, without replacement, from the nodes 'connect_candidates' allows, and scored in
+        batches until param:num of them pass or 'connect_budget' times param:num nodes have been drawn.
+        Because the draws come in random order, whatever is found is a uniform sample of u's candidates, just as
+        get_connections() would pick after scoring everyone.  The only bias is in how many are found: if a
+        fraction q of the B = 'connect_budget' * param:num nodes that may be drawn pass, and q > param:num / B,
+        then fewer than param:num are found with probability at most exp(-2 * B * (q - param:num / B) ** 2).
+
+        :param u: the node looking for new connections
+        :param num: the number of candidates wanted
+        :return: array of node_index rows of at most param:num candidate nodes, in random order
+        '''
+        exclude = set(self[u])
+        exclude.add(u)
+        if self.settings.connect_candidates == 'all':
+            pool = None
+            size = len(self.node_list)
+        else:
+            pool = self._connection_pool(u, exclude)
+            size = len(pool)
+        drawn = self.rng.choice(size, min(self.settings.connect_budget * num, size), replace=False)
+        if pool is not None:
+            drawn = pool[drawn]
+        else:
+            drawn = drawn[~np.isin(drawn, [self.node_index[v] for v in exclude])]
+
+        # Score twice as many draws as there are candidates still missing, until enough pass
+        found, start = [], 0
+        while start < len(drawn) and len(found) < num:
+            batch = drawn[start:start + 2 * (num - len(found))]
+            found.extend(batch[self._passes_connect(u, batch)])
+            start += len(batch)
+        return np.array(found[:num], dtype=np.intp)
+
+    def _connection_pool(self, u, exclude):
+        '''
+        Find the nodes get_connection_candidates() considers under the 'two_hop' and 'mixed' modes, before scoring.
+        The two-hop neighborhood is enumerated in full, not sampled.
+
+        :param u: the node looking for new connections
+        :param exclude: u and the nodes it is already connected to
+        :return: array of node_index rows, sorted
+        '''
+        # Walk two steps from u along the adjacency snapshot.  get_connections() proposes every tie before adding
+        # any, so the snapshot is built at most once per step.
+        A = self.get_adjacency()
+        i = self.node_index[u]
+        _, pos = csr_gather(A.indptr, A.indices[A.indptr[i]:A.indptr[i + 1]])
+        rows = np.unique(A.indices[pos])
+
+        # Mix in a few nodes from anywhere in the network
+        frac = self.settings.global_candidates
+        if self.settings.connect_candidates == 'mixed' and frac > 0:
+            k = max(1, int(np.ceil(frac * len(rows))))
+            rows = np.union1d(rows, self.rng.integers(0, len(self.node_list), k))
+
+        return rows[~np.isin(rows, [self.node_index[v] for v in exclude])]
+
+    def _passes_connect(self, u, rows):
+        '''
+        Check which of the given nodes give u a reward that passes 'thresh_connect'.
+
+        :param u: the node looking for new connections
+        :param rows: array of node_index rows of nodes u is not connected to
+        :return: boolean array, True where the node passes
+        '''
+        # As in get_connection_candidates(), only the nodes u can see need to be scored; the rest share the reward
+        # of a blank view
+        thresh = self.settings.thresh_connect
+        masks = self.mask_store.slots.get(u, {})
+        seen = np.array([self.node_list[j] in masks for j in rows], dtype=bool)
+        keep = np.full(len(rows), self._reward_from_distance([u], np.zeros(1))[0] >= thresh)
+        if seen.any():
+            keep[seen] = self.reward_many(u, [self.node_list[j] for j in rows[seen]]) >= thresh
+        return keep
 
     def get_disconnections(self):
         '''
+        Pick random nodes and have each of them drop up to 'num_disconnections' of its ties whose raw reward falls
+        below 'thresh_disconnect', each with probability 'p_disconnect'.  Every outgoing edge of the chosen nodes is
+        scored in one pass over the adjacency snapshot, and the chosen edges are resolved with _resolve_proposals()
+        and removed with disconnect_many(), so the result does not depend on the order in which nodes were picked.
 
-        :return:
+        :return: A list of edges removed
         '''
-        if self.prop('p_disconnect') == 0:
+        settings = self.settings
+        if settings.p_disconnect == 0:
             return []
-        ret = []
-        mynodes = self.get_n_random_nodes(self.prop('num_nodes_disconnect'))
-        num_d = self.prop('num_disconnections')
-        for node in mynodes:
-            if self.isgraph() or self.ismultigraph():
-                nbrs = list(self.neighbors(node))
-            else:
-                nbrs = list(self.successors(node))
-            possible = [j for j in nbrs if self.reward(node, j, raw=True) < self.prop('thresh_disconnect') and j != node]
-            if not possible:
-                continue
-            random.shuffle(possible)
-            possible = sorted(possible[:num_d])
-            for c in possible:
-                ret.extend(self.disconnect(node, c, p=self.prop('p_disconnect')))
-        return ret
+        mynodes = self.get_n_random_nodes(settings.num_nodes_disconnect)
+        src = np.array([self.node_index[u] for u in mynodes], dtype=np.intp)
+
+        # Gather the neighbors (successors, in a directed graph) of the chosen nodes, leaving out selfloops
+        A = self.get_adjacency()
+        owner, pos = csr_gather(A.indptr, src)
+        rows, cols = src[owner], A.indices[pos]
+        keep = rows != cols
+        owner, rows, cols = owner[keep], rows[keep], cols[keep]
+
+        # Score every edge's raw reward at once and keep the ones below the threshold
+        a, b = self.states[rows], self.states[cols]
+        visible = np.ones(a.shape, dtype=bool) if self.categories is not None else b != 0
+        rewards = self._reward_from_distance([self.node_list[i] for i in rows],
+                                             dist_many(a, b, visible, settings.distance))
+        keep = rewards < settings.thresh_disconnect
+        owner, rows, cols = owner[keep], rows[keep], cols[keep]
+
+        # Shuffle the edges within each chosen node, and take the first num_disconnections of each
+        order = np.lexsort((self.rng.random(len(owner)), owner))
+        owner, rows, cols = owner[order], rows[order], cols[order]
+        rank = np.arange(len(owner)) - np.searchsorted(owner, owner)
+        keep = (rank < settings.num_disconnections) & (self.rng.random(len(owner)) < settings.p_disconnect)
+        owner, rows, cols = owner[keep], rows[keep], cols[keep]
+
+        # Remove every node's picks together, whichever node picked them first
+        return self.disconnect_many(self._resolve_proposals(rows, cols, not settings.directed))
 
     def get_n_random_nodes(self, num):
         '''
@@ -1784,8 +3030,7 @@ class SocialNetwork:
             num = n
         if num == n:
             return mynodes
-        random.shuffle(mynodes)
-        return mynodes[:num]
+        return [mynodes[i] for i in self.rng.choice(n, num, replace=False)]
 
     def step(self):
         '''
@@ -1795,8 +3040,36 @@ class SocialNetwork:
         rmv = self.get_disconnections()
         self.update()
         add = self.get_connections()
+        self.diagnostics['num_rewired'] = len(rmv) + len(add)
         return rmv, add
 
+    def run(self, max_steps, until=None, tol=0.):
+        '''
+        Call step() up to param:max_steps times, stopping early once the chosen criterion holds after a step.
+        self.diagnostics describes the last step taken.
+
+        :param max_steps: the most steps to take
+        :param until: when to stop early:
+                      None to always take param:max_steps steps,
+                      'fixed' to stop after a step that changed no state and no edge,
+                      'converged' to stop after a step that moved no state by more than param:tol,
+                      'absorbed' to stop once is_absorbed() holds,
+                      or a function that takes the network and returns True to stop
+        :param tol: the largest state change allowed under 'converged'
+        :return: the number of steps taken
+        '''
+        if until not in [None, 'fixed', 'converged', 'absorbed'] and not callable(until):
+            raise ValueError(f'Unknown stopping criterion: {until}')
+        for i in range(max_steps):
+            self.step()
+            d = self.diagnostics
+            if until == 'fixed' and d['num_changed'] == 0 and d['num_rewired'] == 0 or \
+                    until == 'converged' and d['max_delta'] <= tol or \
+                    until == 'absorbed' and self.is_absorbed() or \
+                    callable(until) and until(self):
+                return i + 1
+        return max_steps
+
     # Method aliases
     prop = property
     props = properties
\ No newline at end of file
@@ -1,11 +1,14 @@
-import random as rnd
-
+from scipy import sparse
 from scipy.spatial import distance
+from scipy.special import log_ndtr, ndtri_exp
 import tkinter as tk
 import numpy as np
 import time
 import matplotlib.pyplot as plt
-from random import shuffle
+from collections.abc import Mapping
+
+# Generator for helpers called without one of their own
+_RNG = np.random.default_rng()
 
 # Error message classes
 class InvalidPropertyError(Exception):
@@ -19,29 +22,324 @@ class IncompatiblePropertyError(Exception):
 
 class Bound:
     '''
-    A helper class to restrict inputs to be between certain values.
+    A helper class to restrict inputs to be between certain values, and optionally to be integers.
     '''
-    def __init__(self, lo, hi):
+    def __init__(self, lo, hi, integer=False):
         self.lo = lo
         self.hi = hi
+        self.integer = integer
 
     def __str__(self):
-        return f'range [{self.lo}, {self.hi}]'
+        return f'{"integer " if self.integer else ""}range [{self.lo}, {self.hi}]'
 
     def __contains__(self, item):
+        if self.integer and (isinstance(item, bool) or not isinstance(item, (int, np.integer))):
+            return False
         try:
             return self.lo <= item <= self.hi
         except TypeError:
             return False
 
-def coin_flip(p):
+class StateView(Mapping):
+    '''
+    A read-only, dictionary-like view of a SocialNetwork's diffusion state matrix.
+    Indexing by node returns a copy of that node's row as a list, so the underlying matrix cannot be
+    changed through the view.
+    '''
+    def __init__(self, network):
+        self.network = network
+
+    def __getitem__(self, node):
+        return self.network.get_state(node)
+
+    def __iter__(self):
+        return iter(self.network.node_index)
+
+    def __len__(self):
+        return len(self.network.node_index)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+class MaskStore:
+    '''
+    Bit-packed storage for visibility masks.  Each (viewer, target) pair owns a slot, which is one row of
+    self.bits holding one bit per dimension.  self.slots[viewer][target] gives the slot for that pair, and
+    slots freed by removed edges are reused.  self.version goes up every time a mask changes, and the viewers whose
+    masks changed are collected in self.changed until someone clears it.
+    Given an index from nodes to state matrix rows, the rows of each slot's viewer and target are kept in flat arrays
+    as well, so that pair_keys() can line the slots up with other arrays of node pairs.
+    '''
+    def __init__(self, num_dimensions, capacity=16, index=None):
+        self.num_dimensions = num_dimensions
+        self.bits = np.zeros((capacity, max(1, (num_dimensions + 7) // 8)), dtype=np.uint8)
+        self.index = {} if index is None else index
+        self.viewer_rows = np.full(capacity, -1, dtype=np.intp)
+        self.target_rows = np.full(capacity, -1, dtype=np.intp)
+        self.slots = {}
+        self.free = []
+        self.size = 0
+        self.version = 0
+        self.owners = []
+        self.changed = set()
+
+    def __contains__(self, pair):
+        viewer, target = pair
+        return viewer in self.slots and target in self.slots[viewer]
+
+    def slot(self, viewer, target):
+        '''
+        Return the slot of a (viewer, target) pair, allocating it if needed.
+        '''
+        if (viewer, target) in self:
+            return self.slots[viewer][target]
+        if self.free:
+            s = self.free.pop()
+        else:
+            if self.size == len(self.bits):
+                self.bits = np.concatenate([self.bits, np.zeros_like(self.bits)])
+                self.viewer_rows = np.concatenate([self.viewer_rows, np.full(len(self.viewer_rows), -1, dtype=np.intp)])
+                self.target_rows = np.concatenate([self.target_rows, np.full(len(self.target_rows), -1, dtype=np.intp)])
+            s = self.size
+            self.size += 1
+            self.owners.append(None)
+        self.slots.setdefault(viewer, {})[target] = s
+        self.owners[s] = viewer
+        self.viewer_rows[s], self.target_rows[s] = self.index.get(viewer, -1), self.index.get(target, -1)
+        return s
+
+    def remove(self, viewer, target):
+        '''
+        Remove the mask of a (viewer, target) pair.  Raises a KeyError if it does not exist.
+        '''
+        s = self.slots[viewer].pop(target)
+        self.bits[s] = 0
+        self.viewer_rows[s], self.target_rows[s] = -1, -1
+        self.free.append(s)
+        self.version += 1
+        self.changed.add(viewer)
+
+    def set(self, slots, vals):
+        '''
+        Overwrite the masks in the given slots with rows of 0/1 values.
+        '''
+        vals = np.broadcast_to(np.asarray(vals, dtype=np.uint8), (np.size(slots), self.num_dimensions))
+        self.bits[slots] = np.packbits(vals, axis=1, bitorder='little')
+        self._mark(slots)
+
+    def set_bit(self, slots, k, val):
+        '''
+        Set bit k of the masks in the given slots to val.
+        '''
+        if val:
+            self.bits[slots, k // 8] |= np.uint8(1 << (k % 8))
+        else:
+            self.bits[slots, k // 8] &= np.uint8(~(1 << (k % 8)) & 0xFF)
+        self._mark(slots)
+
+    def _mark(self, slots):
+        '''
+        Record that the masks in the given slots changed.
+        '''
+        self.version += 1
+        self.changed.update([self.owners[s] for s in np.atleast_1d(slots)])
+
+    def pair_keys(self, n):
+        '''
+        Return the key viewer_row * n + target_row of every stored pair whose nodes both have rows, sorted, along
+        with the slot of each, so that pairs can be looked up by bisection.
+
+        :param n: the number of rows
+        :return: two aligned arrays: the sorted keys and their slots
+        '''
+        live = np.flatnonzero((self.viewer_rows[:self.size] >= 0) & (self.target_rows[:self.size] >= 0))
+        keys = self.viewer_rows[live].astype(np.int64) * n + self.target_rows[live]
+        order = np.argsort(keys)
+        return keys[order], live[order]
+
+    def gather(self, slots):
+        '''
+        Return the masks in the given slots as a boolean array with one row per slot.
+        '''
+        rows = np.unpackbits(self.bits[slots], axis=-1, count=self.num_dimensions, bitorder='little')
+        return rows.astype(bool)
+
+class MaskView(Mapping):
+    '''
+    A read-only, dictionary-like view of a MaskStore.  view[viewer][target] is the list of 0/1 values telling
+    which of target's dimensions are visible to viewer.
+    '''
+    def __init__(self, network):
+        self.network = network
+
+    def __getitem__(self, viewer):
+        store = self.network.mask_store
+        if viewer not in self.network.node_index:
+            raise KeyError(viewer)
+        row = store.slots.get(viewer, {})
+        masks = store.gather(list(row.values())).astype(int).tolist()
+        return dict(zip(row.keys(), masks))
+
+    def __iter__(self):
+        return iter(self.network.node_index)
+
+    def __len__(self):
+        return len(self.network.node_index)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+class PairWeights:
+    '''
+    Aggregated edge weights, one entry per (influenced, influencer) pair, so that parallel edges count once in total.
+    self.slots[u][v] gives the slot holding the total weight of the edges through which v influences u, and
+    self.totals[u] is the sum of u's incoming weights.  Like MaskStore, slots freed by removed pairs are reused, and
+    the weights are kept in flat arrays, so that tocsr() can turn them into a sparse matrix over state matrix rows
+    without looking at each pair.
+    '''
+    def __init__(self, network, capacity=16):
+        self.network = network
+        self.target = np.full(capacity, -1, dtype=np.intp)
+        self.source = np.full(capacity, -1, dtype=np.intp)
+        self.weight = np.zeros(capacity)
+        self.slots = {}
+        self.totals = {}
+        self.free = []
+        self.size = 0
+        self._csr = None
+
+    def get(self, u, v, default=0.):
+        '''
+        Return the total weight of the edges through which v influences u.
+        '''
+        s = self.slots.get(u, {}).get(v)
+        return default if s is None else float(self.weight[s])
+
+    def row(self, u):
+        '''
+        Return a dict from each of u's influencers to the total weight of its edges to u.
+        '''
+        row = self.slots.get(u, {})
+        return dict(zip(row.keys(), self.weight[list(row.values())].tolist()))
+
+    def set(self, u, v, w):
+        '''
+        Set the total weight of the edges through which v influences u.
+        '''
+        row = self.slots.setdefault(u, {})
+        if v in row:
+            s = row[v]
+            self.totals[u] = self.totals.get(u, 0.) - self.weight[s] + w
+        else:
+            if self.free:
+                s = self.free.pop()
+            else:
+                if self.size == len(self.weight):
+                    grow = len(self.weight)
+                    self.target = np.concatenate([self.target, np.full(grow, -1, dtype=np.intp)])
+                    self.source = np.concatenate([self.source, np.full(grow, -1, dtype=np.intp)])
+                    self.weight = np.concatenate([self.weight, np.zeros(grow)])
+                s = self.size
+                self.size += 1
+            row[v] = s
+            index = self.network.node_index
+            self.target[s], self.source[s] = index.get(u, -1), index.get(v, -1)
+            self.totals[u] = self.totals.get(u, 0.) + w
+        self.weight[s] = w
+        self._csr = None
+
+    def remove(self, u, v):
+        '''
+        Forget the pair (u, v), if it is stored.
+        '''
+        s = self.slots.get(u, {}).pop(v, None)
+        if s is None:
+            return
+        self.totals[u] -= self.weight[s]
+
+        # Start from an exact zero once u has no influencers left
+        if not self.slots[u]:
+            self.totals[u] = 0.
+        self.target[s], self.source[s], self.weight[s] = -1, -1, 0.
+        self.free.append(s)
+        self._csr = None
+
+    def tocsr(self):
+        '''
+        Return the weights as a sparse matrix W over state matrix rows, where W[i, j] is the total weight of the
+        edges through which node_list[j] influences node_list[i].  The matrix is reused until a weight changes.
+        '''
+        if self._csr is None:
+            n = len(self.network.node_list)
+            live = (self.target[:self.size] >= 0) & (self.source[:self.size] >= 0)
+            self._csr = sparse.csr_matrix((self.weight[:self.size][live], (self.target[:self.size][live],
+                                                                            self.source[:self.size][live])),
+                                          shape=(n, n))
+        return self._csr
+
+class NormalizedWeightView(Mapping):
+    '''
+    A read-only, dictionary-like view of a SocialNetwork's normalized edge weights.  view[u][v] is the fraction of u's
+    total incoming weight that comes from v, computed from the network's running totals when it is read.
+    '''
+    def __init__(self, network):
+        self.network = network
+
+    def __getitem__(self, u):
+        if u not in self.network:
+            raise KeyError(u)
+        weights = self.network.pair_weights
+        total = weights.totals.get(u, 0.)
+        return {v: w / total for v, w in weights.row(u).items()}
+
+    def __iter__(self):
+        return iter(self.network)
+
+    def __len__(self):
+        return len(self.network)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+class Settings:
+    '''
+    A frozen snapshot of the properties read in a SocialNetwork's hot loops.  Reading settings.directed is a plain
+    slot lookup, where prop('directed') goes through the property dispatcher and the graph dictionary.
+    SocialNetwork rebuilds its snapshot whenever a property is set; properties that were not defined at that point
+    are left unset, so reading them raises AttributeError.
+    '''
+    __slots__ = ('n', 'graphtype', 'directed', 'multiedge', 'symmetric', 'selfloops', 'normalize', 'weight_dist',
+                 'num_dimensions', 'dimensions', 'visibility', 'distance', 'gravity', 'update_method', 'p_update',
+                 'p_connect', 'p_disconnect', 'num_nodes_update', 'num_nodes_connect', 'num_nodes_disconnect',
+                 'num_connections', 'num_disconnections', 'num_influencers', 'thresh_connect', 'thresh_disconnect',
+                 'confidence_dist', 'resistance_dist', 'agent_models', 'types', 'confidence', 'resistance',
+                 'transmission_probs', 'q', 'timing', 'update_order', 'connect_candidates',
+                 'global_candidates', 'connect_budget')
+
+    def __init__(self, props):
+        for name in self.__slots__:
+            if name in props:
+                object.__setattr__(self, name, props[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Settings are read-only.  Use SocialNetwork.prop() to change a property.')
+
+    def __delattr__(self, name):
+        raise AttributeError('Settings are read-only.  Use SocialNetwork.prop() to change a property.')
+
+    def __repr__(self):
+        return f'Settings({", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__ if hasattr(self, name))})'
+
+def coin_flip(p, rng=None):
     '''
     Returns True p% of the time, False 1-p% of the time.
 
     :param p: Probability to return True
+    :param rng: the random number generator to draw from, such as a SocialNetwork's self.rng, or None to use the
+                module's own generator
     :return: Boolean
     '''
-    return rnd.random() < p
+    return (_RNG if rng is None else rng).random() < p
 
 def dist(vec1, vec2, metric):
     """
@@ -62,6 +360,75 @@ def dist(vec1, vec2, metric):
     elif metric == 'cosine':
         return distance.cosine(distvec1, distvec2)
 
+def csr_gather(indptr, rows):
+    '''
+    Locate every stored entry in the given rows of a compressed sparse (CSR or CSC) structure.
+
+    :param indptr: the index pointer array of the structure
+    :param rows: an array of row (or column, for CSC) indices
+    :return: for each entry, the position in param:rows it belongs to and its position in the structure's
+             indices and data arrays
+    '''
+    rows = np.asarray(rows, dtype=np.intp)
+    starts = indptr[rows]
+    counts = indptr[rows + 1] - starts
+    owner = np.repeat(np.arange(len(rows)), counts)
+    pos = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+    return owner, pos
+
+def dist_many(vecs1, vecs2, visible, metric):
+    """
+    Batched version of dist().  Compares row i of param:vecs1 to row i of param:vecs2 over the dimensions that are
+    visible in row i of param:visible.
+
+    :param vecs1: 2D array of perceiving agents' feature vectors
+    :param vecs2: 2D array of perceived agents' feature vectors
+    :param visible: 2D boolean array marking which dimensions of param:vecs2 take part in each comparison
+    :param metric: 'hamming', 'euclidean', or 'cosine'
+    :return: 1D array of distances; rows with no visible dimensions get distance 0
+    """
+    keep = np.asarray(visible, dtype=bool)
+    count = keep.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if metric == 'hamming':
+            d = (keep & (vecs1 != vecs2)).sum(axis=1) / count
+        elif metric == 'euclidean':
+            d = np.sqrt((np.where(keep, vecs1 - vecs2, 0.) ** 2).sum(axis=1))
+        elif metric == 'cosine':
+            a, b = np.where(keep, vecs1, 0.), np.where(keep, vecs2, 0.)
+            d = np.clip(1. - (a * b).sum(axis=1) / np.sqrt((a * a).sum(axis=1) * (b * b).sum(axis=1)), 0., 2.)
+    return np.where(count == 0, 0., d)
+
+def truncated_normal(mu, sigma, lo, hi, size, rng=None):
+    '''
+    Draw values from a normal distribution truncated to [lo, hi] by inverting its CDF.  Every value costs one uniform
+    draw, however narrow the window or however far it lies from the mean.
+
+    :param mu: mean of the untruncated distribution
+    :param sigma: standard deviation of the untruncated distribution
+    :param lo: smallest value allowed
+    :param hi: largest value allowed
+    :param size: the number of values to draw
+    :param rng: the numpy Generator to draw from, or None to use np.random
+    :return: array of values
+    '''
+    if sigma <= 0 or lo == hi:
+        return np.full(size, min(max(mu, lo), hi), dtype=np.float64)
+
+    # Work in the lower tail, where the CDF keeps its precision, by mirroring windows above the mean
+    a, b = (lo - mu) / sigma, (hi - mu) / sigma
+    sign = 1.
+    if a > 0:
+        a, b, sign = -b, -a, -1.
+
+    # Pick a uniform point between CDF(a) and CDF(b) in log space and map it back through the inverse CDF
+    la, lb = log_ndtr(a), log_ndtr(b)
+    u = (np.random if rng is None else rng).uniform(0., 1., size)
+    with np.errstate(divide='ignore'):
+        logp = np.logaddexp(la + np.log1p(-u), lb + np.log(u))
+    x = np.clip(ndtri_exp(logp), a, b)
+    return np.clip(mu + sign * sigma * x, lo, hi)
+
 def xor(c1, c2):
     '''
     Returns the exclusive or of two truth values
@@ -72,11 +439,18 @@ def xor(c1, c2):
     '''
     return (c1 or c2) and not (c1 and c2)
 
-def sample(mylist, num):
-    try:
-        return rnd.sample(mylist, num)
-    except:
-        return rnd.sample(mylist, len(mylist))
+def sample(mylist, num, rng=None):
+    '''
+    Pick num items of mylist at random without replacement, or all of them in random order if there are fewer.
+
+    :param mylist: the list to sample from
+    :param num: the number of items to pick
+    :param rng: the random number generator to draw from, such as a SocialNetwork's self.rng, or None to use the
+                module's own generator
+    :return: a list of the picked items
+    '''
+    rng = _RNG if rng is None else rng
+    return [mylist[i] for i in rng.choice(len(mylist), min(num, len(mylist)), replace=False)]
 
 # Helpful constants to check data types
 BOOL = type(bool())
@@ -96,6 +470,7 @@ MININT_32 = -2147483647
 # Objects to make life easier when getting input within a certain range
 PROB = Bound(0., 1.)
 POSNUM = Bound(0, MAXINT_32)
+POSINT = Bound(0, MAXINT_32, integer=True)
 SYMNUM = Bound(-MAXINT_32, MAXINT_32)
 SYMBIN = Bound(-1., 1.)
 
@@ -1,5 +1,6 @@
 # Test suite for SocialNetwork.py
 import networkx
+import random as rnd
 
 from helpers import *
 from SocialNetwork import SocialNetwork
@@ -247,6 +248,58 @@ def test_1_26():
     s.connect(0, 0)
     return 0 not in s[0]
 
+def test_1_27():
+    # Check that the settings snapshot follows properties set after construction.
+    s = SocialNetwork(n=5, gravity=.5)
+    s.prop(gravity=2., p_connect=.3)
+    return s.settings.gravity == 2. and s.settings.p_connect == .3 and s.settings.directed is False
+
+def test_1_28():
+    # Check that the settings snapshot is read-only.
+    s = SocialNetwork(n=5)
+    try:
+        s.settings.directed = True
+        return False
+    except AttributeError:
+        return not s.settings.directed
+
+def test_1_29():
+    # Check that properties that were never defined are missing from the settings snapshot.
+    s = SocialNetwork(n=5)
+    return not hasattr(s.settings, 'distance') and not hasattr(s.settings, 'confidence')
+
+def seeded_run(seed, **kwargs):
+    s = SocialNetwork(n=30, saturation=.2, weight_dist='uniform', visibility='random', seed=seed, **kwargs)
+    steps = [s.step() for _ in range(3)]
+    return steps, sorted(s.edges(data='weight')), s.states.copy(), s.prop('masks')
+
+def test_1_30():
+    # Check that equal seeds give equal networks and runs, and different seeds do not.
+    a, b, c = seeded_run(7, topology='random'), seeded_run(7, topology='random'), seeded_run(8, topology='random')
+    return a[:2] == b[:2] and np.array_equal(a[2], b[2]) and a[3] == b[3] and a[1] != c[1]
+
+def test_1_31():
+    # Check that seeds also fix the small world and scale free topologies.
+    return seeded_run(3, topology='small world')[1] == seeded_run(3, topology='small world')[1] and \
+        seeded_run(3, topology='scale free', directed=True)[1] == seeded_run(3, topology='scale free', directed=True)[1]
+
+def test_1_32():
+    # Check that a network draws nothing from the global random number generators.
+    r, g = rnd.getstate(), np.random.get_state()[1].copy()
+    s = SocialNetwork(n=20, topology='random', saturation=.3, weight_dist='normal', weight_min=0., weight_max=1.,
+                      weight_mean=.5, weight_stdev=.2, update_method='qvoter', dimensions='binary')
+    s.run(3)
+    return rnd.getstate() == r and np.array_equal(np.random.get_state()[1], g)
+
+def test_1_33():
+    # Make sure coin_flip() and sample() draw from the generator they are given, or their own when given none.
+    a, b = np.random.default_rng(4), np.random.default_rng(4)
+    flips = [coin_flip(.5, a) for _ in range(20)] == [coin_flip(.5, b) for _ in range(20)]
+    picks = sample(list(range(10)), 4, a)
+    return flips and picks == sample(list(range(10)), 4, b) and len(set(picks)) == 4 and \
+        sorted(sample([1, 2], 5, a)) == [1, 2] and coin_flip(1.) and not coin_flip(0.) and \
+        sorted(sample(list(range(5)), 9)) == list(range(5))
+
 # The 2 run of tests is for ensuring that functionality around edge weights and other distribution-based attributes
 # is working correctly.
 
@@ -713,6 +766,59 @@ def test_2_55():
     d = s.prop('normalized_weights')
     return 1 in d[0] and 0 in d[1] and d[0][1] == d[1][0]
 
+def test_2_56():
+    # Check that normalized weights track a from-scratch total after many edge changes in MultiDiGraph.
+    s = SocialNetwork(n=6, topology='random', saturation=.5, weight_dist='uniform', directed=True, multiedge=True,
+                      symmetric=False, normalize=True)
+    for _ in range(100):
+        u, v = rnd.randrange(6), rnd.randrange(6)
+        if v in s[u] and coin_flip(.5, s.rng):
+            s.disconnect(u, v)
+        else:
+            s.connect(u, v)
+    d = s.prop('normalized_weights')
+    for i in s:
+        w = {j: sum(e['weight'] for e in s[j][i].values()) for j in s.predecessors(i)}
+        if d[i].keys() != w.keys() or any(abs(d[i][j] - w[j] / sum(w.values())) > .000001 for j in w):
+            return False
+    return True
+
+def test_2_57():
+    # Check that normalized weights are updated appropriately when a hub loses an edge in Graph.
+    s = SocialNetwork(n=5, topology='star', weight_dist='constant', normalize=True, selfloops=False)
+    s.disconnect(0, 1)
+    d = s.prop('normalized_weights')
+    return d[1] == {} and 1 not in d[0] and all(abs(d[0][i] - .25) < .000001 for i in range(2, 6))
+
+def test_2_58():
+    # Make sure normal weights stay within a narrow window around a wide distribution.
+    s = SocialNetwork(n=50, topology='random', saturation=.5, weight_dist='normal', weight_min=.49, weight_max=.51,
+                      weight_mean=.5, weight_stdev=1000.)
+    return all(.49 <= w <= .51 for _, _, w in s.edges(data='weight'))
+
+def test_2_59():
+    # Make sure truncated normal values far out in the tail stay in bounds and keep the right shape.
+    vals = truncated_normal(0., 1., 30., 31., 10000)
+    return vals.min() >= 30. and vals.max() <= 31. and abs(vals.mean() - 30.033) < .005
+
+def test_2_60():
+    # Check that the aggregated weight matrix tracks from-scratch pair sums after many edge changes in MultiDiGraph.
+    s = SocialNetwork(n=6, topology='random', saturation=.5, weight_dist='uniform', directed=True, multiedge=True,
+                      symmetric=False, seed=5)
+    for _ in range(100):
+        u, v = rnd.randrange(6), rnd.randrange(6)
+        if v in s[u] and coin_flip(.5, s.rng):
+            s.disconnect(u, v)
+        else:
+            s.connect(u, v)
+    W = s.pair_weights.tocsr().toarray()
+    for i in s:
+        for j in s:
+            w = sum(e['weight'] for e in s[j][i].values()) if i in s[j] else 0.
+            if abs(W[s.node_index[i], s.node_index[j]] - w) > .000001:
+                return False
+    return True
+
 # The 3 run of tests is for ensuring that functionality around edge addition and removal is working correctly.
 
 def test_3_00():
@@ -2057,6 +2163,841 @@ def test_4_91():
             return False
     return True
 
+def test_4_92():
+    # Make sure masks are stored bit-packed, one bit per dimension.
+    s = SocialNetwork(n=5, num_dimensions=10, topology='complete')
+    return s.mask_store.bits.dtype == np.uint8 and s.mask_store.bits.shape[1] == 2
+
+def test_4_93():
+    # Make sure the neighborhood array agrees with individual views.
+    s = SocialNetwork(n=10, num_dimensions=3, topology='random', saturation=.5, visibility='random')
+    for u in s:
+        nbrs, views = s.get_neighborhood_array(u)
+        for v, row in zip(nbrs, views):
+            if list(row) != s.get_view(u, v):
+                return False
+    return True
+
+def test_4_94():
+    # Make sure mask slots of deleted edges are reused.
+    s = SocialNetwork(n=3, num_dimensions=3)
+    s.connect(0, 1)
+    size = s.mask_store.size
+    s.disconnect(0, 1)
+    s.connect(0, 2)
+    return s.mask_store.size == size and 1 not in s.prop('masks')[0] and 2 in s.prop('masks')[0]
+
+def test_4_95():
+    # Make sure broadcast and nocast work on dimensions stored past the first byte.
+    s = SocialNetwork(n=4, num_dimensions=10, visibility='hidden')
+    for v in [1, 2, 3]:
+        s.connect(0, v)
+    s.broadcast(0, 9)
+    seen = all(s.prop('masks')[v][0] == [0] * 9 + [1] for v in [1, 2, 3])
+    s.broadcast_all(0)
+    s.nocast(0, 8)
+    hidden = all(s.prop('masks')[v][0] == [1] * 8 + [0, 1] for v in [1, 2, 3])
+    return seen and hidden and s.prop('masks')[0][0] == [1] * 10
+
+def test_4_96():
+    # Make sure the masks property cannot be written to.
+    s = SocialNetwork(n=2)
+    try:
+        s.prop('masks')[0] = {}
+        return False
+    except TypeError:
+        return True
+
+# The 5 run of tests is for ensuring that the diffusion state matrix and its read-only view are working correctly.
+
+def test_5_00():
+    # Make sure the state matrix has one row per node and one column per dimension.
+    s = SocialNetwork(n=10, num_dimensions=3)
+    return s.states.shape == (10, 3)
+
+def test_5_01():
+    # Make sure the diffusion_space view agrees with the state matrix.
+    s = SocialNetwork(n=10, num_dimensions=3, dimensions='continuous', initialize_at_extremes=False)
+    d = s.prop('diffusion_space')
+    return all(d[node] == list(s.states[s.node_index[node]]) for node in s)
+
+def test_5_02():
+    # Make sure the diffusion_space view cannot be written to.
+    s = SocialNetwork(n=2, num_dimensions=3)
+    try:
+        s.prop('diffusion_space')[0] = [0, 0, 0]
+        return False
+    except TypeError:
+        return True
+
+def test_5_03():
+    # Make sure that modifying a value returned by the view does not modify the state matrix.
+    s = SocialNetwork(n=2, num_dimensions=3)
+    vals = s.prop('diffusion_space')[0]
+    vals[0] = 5
+    return s.prop('diffusion_space')[0][0] != 5
+
+def test_5_04():
+    # Make sure set_state() is reflected in the view.
+    s = SocialNetwork(n=2, num_dimensions=3, dimensions='continuous')
+    s.set_state(1, [.5, -.5, 0])
+    return s.prop('diffusion_space')[1] == [.5, -.5, 0]
+
+def test_5_05():
+    # Make sure categorical values are stored as integer codes and read back as categories.
+    s = SocialNetwork(n=10, dimensions='categorical', category_dist={'S': .5, 'I': .5})
+    d = s.prop('diffusion_space')
+    return s.states.dtype.kind == 'i' and sorted(d[i][0] for i in s) == ['I'] * 5 + ['S'] * 5
+
+def test_5_06():
+    # Make sure that categories which do not appear in the initial distribution can still be stored.
+    s = SocialNetwork(n=2, dimensions='categorical', category_dist={'S': 1.})
+    s.set_state(0, ['R'])
+    return s.prop('diffusion_space')[0] == ['R'] and s.prop('diffusion_space')[1] == ['S']
+
+# The 6 run of tests is for ensuring that batched (vectorized) update rules agree with their per-node counterparts.
+
+def test_6_00():
+    # Make sure batched averaging matches per-node averaging on continuous dimensions.
+    s = SocialNetwork(n=30, topology='random', saturation=.2, num_dimensions=3, dimensions='continuous',
+                      initialize_at_extremes=False)
+    nodes = list(s.nodes())
+    batch = s.nextstates_average(nodes)
+    return all(list(batch[i]) == s.nextstate_average(u) for i, u in enumerate(nodes))
+
+def test_6_01():
+    # Make sure batched averaging matches per-node averaging on binary dimensions with partially hidden views.
+    s = SocialNetwork(n=30, topology='random', saturation=.2, num_dimensions=3, visibility='random')
+    nodes = list(s.nodes())
+    batch = s.nextstates_average(nodes)
+    return all(list(batch[i]) == s.nextstate_average(u) for i, u in enumerate(nodes))
+
+def test_6_02():
+    # Make sure batched weighted averaging matches per-node weighted averaging in DiGraph.
+    s = SocialNetwork(n=30, topology='random', saturation=.2, num_dimensions=2, dimensions='continuous',
+                      initialize_at_extremes=False, directed=True, weight_dist='uniform')
+    s.prop(update_method='wt. avg.')
+    nodes = list(s.nodes())
+    batch = s.nextstates_average(nodes, weighted=True)
+    return all(abs(batch[i] - s.nextstate_average(u)).max() < 1e-9 for i, u in enumerate(nodes))
+
+def test_6_03():
+    # Make sure batched averaging respects resistance and negative gravity.
+    s = SocialNetwork(n=30, topology='random', saturation=.2, num_dimensions=2, dimensions='continuous',
+                      initialize_at_extremes=False, resistance_dist='uniform', gravity=-.5)
+    nodes = list(s.nodes())
+    batch = s.nextstates_average(nodes)
+    return all(list(batch[i]) == s.nextstate_average(u) for i, u in enumerate(nodes))
+
+def test_6_04():
+    # Make sure the batched path samples 'num_influencers' distinct neighbors per node when it has to.
+    s = SocialNetwork(n=10, topology='complete', num_influencers=2)
+    nodes = list(s.nodes())
+    rows, cols, _ = s._influence_edges(nodes, sample=True)
+    return s.nextstates_average(nodes) is not None and (np.bincount(rows, minlength=10) == 2).all() and \
+        len(set(zip(rows, cols))) == 20 and all(s.node_index[nodes[i]] != j for i, j in zip(rows, cols))
+
+def test_6_05():
+    # Make sure update() only changes the nodes it selects when using the batched path.
+    s = SocialNetwork(n=30, topology='random', saturation=.2, dimensions='continuous', num_nodes_update=5)
+    before = s.states.copy()
+    s.update()
+    return (s.states != before).any(axis=1).sum() <= 5
+
+def voter_states_match(s):
+    nodes = list(s.nodes())
+    batch = s.nextstates_voter(nodes)
+    if s.categories is not None:
+        batch = np.array(s.categories, dtype=object)[batch]
+    return all(list(batch[i]) == (s.nextstate_voter(u) if s.get_influencers(u) else s.get_state(u))
+               for i, u in enumerate(nodes))
+
+def test_6_06():
+    # Make sure batched voter updates match per-node voter updates with partially hidden views.
+    s = SocialNetwork(n=30, topology='random', saturation=.1, num_dimensions=3, visibility='random',
+                      selfloops=False)
+    return voter_states_match(s)
+
+def test_6_07():
+    # Make sure batched voter updates match per-node voter updates on categorical dimensions in DiGraph.
+    s = SocialNetwork(n=30, topology='random', saturation=.1, num_dimensions=3, dimensions='categorical',
+                      category_dist={'a': .5, 'b': .5}, directed=True, visibility='random')
+    return voter_states_match(s)
+
+def test_6_08():
+    # Make sure q-voter nodes adopt the value all of their influencers share.
+    s = SocialNetwork(n=10, topology='complete', num_dimensions=2, selfloops=False, q=3)
+    s.states[:] = 1.
+    s.states[0] = -1.
+    return (s.nextstates_voter([0], q=3) == 1.).all()
+
+def test_6_09():
+    # Make sure q-voter nodes keep their value when a single influencer disagrees with the rest.
+    s = SocialNetwork(n=3, topology='complete', num_dimensions=1, selfloops=False)
+    s.states[:] = [[-1.], [1.], [-1.]]
+    nxt = s.nextstates_voter([0, 1, 2], q=50)
+    return nxt[0, 0] == -1. and nxt[2, 0] == -1.
+
+def test_6_10():
+    # Make sure update() dispatches the 'qvoter' update method.
+    s = SocialNetwork(n=5, topology='complete', num_dimensions=1, selfloops=False, update_method='qvoter', q=2)
+    s.states[:] = 1.
+    s.states[0] = -1.
+    s.update()
+    return s.states[0, 0] == 1.
+
+def vote_network(*labels):
+    # Node 0 is influenced by one node per label, and labels itself 'c'.
+    s = SocialNetwork(n=len(labels) + 1, num_dimensions=1, dimensions='categorical', category_dist={'c': 1.})
+    for i, label in enumerate(labels):
+        s.connect(0, i + 1)
+        s.set_state(i + 1, [label])
+    return s
+
+def test_6_11():
+    # Make sure batched majority votes pick the value counted more than half as often as there are distinct values.
+    s = vote_network('a', 'a', 'a', 'b')
+    return s.categories[s.nextstates_vote([0])[0, 0]] == 'a'
+
+def test_6_12():
+    # Make sure batched majority votes keep the current value when no value has a majority.
+    s = vote_network('a', 'b', 'd')
+    return s.categories[s.nextstates_vote([0])[0, 0]] == 'c'
+
+def test_6_13():
+    # Make sure batched plurality votes pick the most common value.
+    s = vote_network('a', 'b', 'b', 'd')
+    return s.categories[s.nextstates_vote([0], plurality=True)[0, 0]] == 'b'
+
+def test_6_14():
+    # Make sure batched votes on binary dimensions match per-node votes wherever the outcome does not depend on the
+    # influencer order.
+    s = SocialNetwork(n=30, topology='random', saturation=.2, num_dimensions=3)
+    nodes = list(s.nodes())
+    for plurality in [False, True]:
+        batch = s.nextstates_vote(nodes, plurality=plurality)
+        for i, u in enumerate(nodes):
+            ref = s.nextstate_plurality(u) if plurality else s.nextstate_majority(u)
+            for k in range(3):
+                vals = [view[k] for view in s.get_influencers(u).values()]
+                counts = [vals.count(-1.), vals.count(1.)]
+                if plurality:
+                    unique = counts[0] != counts[1]
+                else:
+                    unique = sum(c * 2 > len(set(vals)) for c in counts) <= 1
+                if unique and batch[i][k] != ref[k]:
+                    return False
+    return True
+
+def test_6_15():
+    # Make sure update() uses the batched path for the 'plurality' update method.
+    s = vote_network('a', 'a', 'b')
+    s.prop(update_method='plurality', num_nodes_update=1)
+    s.update()
+    return s.get_state(0) == ['a'] or s.get_state(0) == ['c']
+
+SIR = {'S': {'contact': {'I': ('I', 1.)}}, 'I': {'auto': {'R': 1.}}, 'R': {}}
+
+def test_6_16():
+    # Make sure transmission probabilities compile into arrays indexed by category code.
+    s = SocialNetwork(n=5, dimensions='categorical', category_dist={'S': 1.},
+                      transmission_probs={'S': {'contact': {'I': ('I', .3)}}, 'I': {'auto': {'R': .5, 'S': .5}}})
+    t = s.compile_transmission()
+    S, I, R = [s.categories.index(c) for c in 'SIR']
+    return t['contact_p'][S, I] == .3 and t['contact_to'][S, I] == I and list(t['auto_to'][I]) == [R, S] and \
+        list(t['auto_cum'][I]) == [.5, .75] and t['contact_p'].sum() == .3
+
+def test_6_17():
+    # Make sure batched transmission infects every susceptible contact and recovers every infected node.
+    s = SocialNetwork(n=4, topology='cycle', dimensions='categorical', category_dist={'S': 1.}, transmission_probs=SIR,
+                      selfloops=False)
+    s.set_state(0, ['I'])
+    nxt = [s.categories[c] for c in s.nextstates_transmission([0, 1, 2, 3])[:, 0]]
+    return nxt == ['R', 'I', 'S', 'I']
+
+def test_6_18():
+    # Make sure batched transmission ignores contacts with a probability of 0 and nodes without influencers.
+    s = SocialNetwork(n=4, dimensions='categorical', category_dist={'S': 1.}, selfloops=False,
+                      transmission_probs={'S': {'contact': {'I': ('I', 0.)}}, 'I': {'auto': {'R': 1.}}, 'R': {}})
+    s.connect(0, 1)
+    s.set_state(0, ['I'])
+    s.set_state(3, ['I'])
+    nxt = [s.categories[c] for c in s.nextstates_transmission([0, 1, 2, 3])[:, 0]]
+    return nxt == ['R', 'S', 'S', 'I']
+
+def test_6_19():
+    # Make sure batched transmission infects at the rate 1 - (1 - p)^k for k infectious contacts.
+    s = SocialNetwork(n=4, dimensions='categorical', category_dist={'I': 1.}, selfloops=False,
+                      transmission_probs={'S': {'contact': {'I': ('I', .5)}}, 'I': {}})
+    for v in [1, 2, 3]:
+        s.connect(0, v)
+    s.set_state(0, ['S'])
+    I = s.categories.index('I')
+    rate = np.mean([s.nextstates_transmission([0])[0, 0] == I for _ in range(4000)])
+    return abs(rate - .875) < .03
+
+def test_6_20():
+    # Make sure update() uses the batched path for the 'transmission' update method.
+    s = SocialNetwork(n=4, topology='cycle', dimensions='categorical', category_dist={'S': 1.}, transmission_probs=SIR,
+                      update_method='transmission', selfloops=False)
+    s.set_state(0, ['I'])
+    s.update()
+    return [s.get_state(u)[0] for u in range(4)] == ['R', 'I', 'S', 'I']
+
+def test_6_21():
+    # Make sure continuous-time transmission reports events in order and stops at the requested time.
+    s = SocialNetwork(n=4, topology='cycle', dimensions='categorical', category_dist={'S': 1.}, selfloops=False,
+                      transmission_probs={'S': {'contact': {'I': ('I', 1.)}}, 'I': {'auto': {'R': .5}}, 'R': {}})
+    s.set_state(0, ['I'])
+    events = s.run_events(50.)
+    times = [t for t, u, k, val in events]
+    return times == sorted(times) and 0 <= times[0] and times[-1] <= 50 and s.clock == 50. and len(events) == 7 and \
+        [s.get_state(u)[0] for u in range(4)] == ['R'] * 4 and [val for t, u, k, val in events[:3]] == ['I'] * 3
+
+def test_6_22():
+    # Make sure continuous-time transmission does nothing without a state that can change.
+    s = SocialNetwork(n=10, topology='random', saturation=.4, dimensions='categorical', category_dist={'S': 1.},
+                      transmission_probs=SIR)
+    return s.run_events(5.) == [] and s.clock == 5. and s.run_events(5.) == [] and s.clock == 10.
+
+def test_6_23():
+    # Make sure continuous-time transmission fires at the rate -log(1 - p).
+    s = SocialNetwork(n=2, dimensions='categorical', category_dist={'I': 1.}, selfloops=False,
+                      transmission_probs={'S': {'contact': {'I': ('I', .5)}}, 'I': {}})
+    s.connect(0, 1)
+    hits = 0
+    for _ in range(2000):
+        s.set_state(0, ['S'])
+        hits += len(s.run_events(1.))
+    return abs(hits / 2000 - .5) < .04
+
+def test_6_24():
+    # Make sure update() advances the clock by one unit with the 'continuous' timing.
+    s = SocialNetwork(n=4, topology='cycle', dimensions='categorical', category_dist={'S': 1.}, selfloops=False,
+                      transmission_probs={'S': {'contact': {'I': ('I', 1.)}}, 'I': {'auto': {'R': .5}}, 'R': {}},
+                      update_method='transmission', timing='continuous')
+    s.set_state(0, ['I'])
+    s.update()
+    return s.clock == 1. and s.get_state(1) != ['S'] and s.get_state(3) != ['S']
+
+def settled_network():
+    # A converged voter network with every node settled.
+    s = SocialNetwork(n=6, topology='cycle', dimensions='binary', num_dimensions=2, update_method='voter',
+                      visibility='visible', selfloops=False)
+    for u in range(6):
+        s.set_state(u, [1, 1])
+    s.update()
+    return s
+
+def test_6_25():
+    # Make sure nodes that keep their state under a deterministic rule are skipped until something changes.
+    s = settled_network()
+    s.update()
+    return s._settled.all() and all(s.get_state(u) == [1, 1] for u in range(6))
+
+def test_6_26():
+    # Make sure a state change unsettles the changed node and the nodes it influences, and nothing else.
+    s = settled_network()
+    s.set_state(0, [-1, 1])
+    return list(s._unsettle()) == [False, False, True, True, True, False]
+
+def test_6_27():
+    # Make sure edge and mask changes unsettle the nodes they touch.
+    s = settled_network()
+    s.connect(0, 3)
+    s.hide(1, 2, 0)
+    return list(s._unsettle()) == [False, True, False, False, True, True]
+
+def test_6_28():
+    # Make sure a property change unsettles every node, and skipped nodes still update once they are unsettled.
+    s = settled_network()
+    s.prop(gravity=.5)
+    unsettled = not s._unsettle().any()
+    s = settled_network()
+    s.set_state(0, [-1, -1])
+    s.set_state(2, [-1, -1])
+    s.update()
+    return unsettled and s.get_state(1) == [-1, -1]
+
+def test_6_29():
+    # Make sure update() records how many nodes changed and by how much.
+    s = settled_network()
+    s.set_state(0, [-1, 1])
+    s.set_state(2, [-1, 1])
+    s.update()
+    return s.diagnostics['num_changed'] == 3 and s.diagnostics['max_delta'] == 2. and s.get_state(1) == [-1, 1]
+
+def test_6_30():
+    # Make sure voter consensus is detected as absorbing, and a disagreeing node breaks it.
+    s = settled_network()
+    absorbed = s.is_absorbed()
+    s.set_state(3, [1, -1])
+    return absorbed and not s.is_absorbed()
+
+def test_6_31():
+    # Make sure transmission is absorbing exactly when no transition can fire.
+    s = SocialNetwork(n=4, topology='cycle', dimensions='categorical', category_dist={'S': 1.}, transmission_probs=SIR,
+                      selfloops=False)
+    absorbed = s.is_absorbed()
+    s.set_state(0, ['I'])
+    return absorbed and not s.is_absorbed()
+
+def test_6_32():
+    # Make sure run() stops as soon as the stopping criterion holds, and otherwise takes every step.
+    s = SocialNetwork(n=4, topology='cycle', dimensions='categorical', category_dist={'S': 1.}, transmission_probs=SIR,
+                      update_method='transmission', selfloops=False, p_connect=0., p_disconnect=0.)
+    s.set_state(0, ['I'])
+    steps = s.run(50, until='absorbed')
+    t = SocialNetwork(n=4, topology='cycle', p_connect=0., p_disconnect=0.)
+    return steps == 3 and [s.get_state(u)[0] for u in range(4)] == ['R'] * 4 and t.run(5) == 5 and \
+        t.run(50, until=lambda net: True) == 1
+
+def test_6_33():
+    # Make sure run() can stop on small state changes, and rejects unknown criteria.
+    s = SocialNetwork(n=20, topology='complete', dimensions='continuous', gravity=.5, p_connect=0., p_disconnect=0.)
+    steps = s.run(100, until='converged', tol=.01)
+    try:
+        s.run(5, until='forever')
+        return False
+    except ValueError:
+        return steps < 100 and s.diagnostics['max_delta'] <= .01
+
+def ordered_pair(order):
+    # Two connected voters that disagree.
+    s = SocialNetwork(n=2, topology='-', dimensions='binary', num_dimensions=1, update_method='voter',
+                      visibility='visible', selfloops=False, update_order=order)
+    s.connect(0, 1)
+    s.set_state(0, [1])
+    s.set_state(1, [-1])
+    s.update()
+    return [s.get_state(0)[0], s.get_state(1)[0]]
+
+def test_6_34():
+    # Make sure the coloring never gives neighbors the same color, and is reused while the topology is unchanged.
+    s = SocialNetwork(n=50, topology='random', saturation=.2, directed=True)
+    c = s.get_coloring()
+    a = s.get_adjacency().tocoo()
+    return all(c[i] != c[j] for i, j in zip(a.row, a.col) if i != j) and s.get_coloring() is c
+
+def test_6_35():
+    # Make sure synchronous updates read old states, while asynchronous and block updates read new ones.
+    return ordered_pair('sync') == [-1, 1] and ordered_pair('async') in [[1, 1], [-1, -1]] and \
+        ordered_pair('block') in [[1, 1], [-1, -1]]
+
+def test_6_36():
+    # Make sure block updates give the same result as updating the color classes one after another.
+    s = SocialNetwork(n=8, topology='cycle', dimensions='continuous', selfloops=False, update_order='block')
+    start = s.states.copy()
+    s.update()
+    outcomes = []
+    for first in [0, 1]:
+        t = SocialNetwork(n=8, topology='cycle', dimensions='continuous', selfloops=False)
+        t.states[:] = start
+        t._unsettle()
+        colors = t.get_coloring()
+        for c in [first, 1 - first]:
+            t._update_batch([u for u in t.nodes() if colors[t.node_index[u]] == c], 'average')
+        outcomes.append(np.array_equal(s.states, t.states))
+    return any(outcomes) and s.get_coloring().max() == 1
+
+def test_6_37():
+    # Make sure batched weighted averaging matches per-node weighted averaging in MultiDiGraph.
+    s = SocialNetwork(n=30, topology='random', saturation=.2, num_dimensions=2, dimensions='continuous',
+                      initialize_at_extremes=False, directed=True, multiedge=True, weight_dist='uniform', seed=3)
+    for _ in range(60):
+        s.connect(rnd.randrange(30), rnd.randrange(30))
+    s.prop(update_method='wt. avg.')
+    nodes = list(s.nodes())
+    batch = s.nextstates_average(nodes, weighted=True)
+    return all(abs(batch[i] - s.nextstate_average(u)).max() < 1e-9 for i, u in enumerate(nodes))
+
+def test_6_38():
+    # Make sure batched weighted averaging leaves nodes without influencers alone, in every update order.
+    for order in ['sync', 'async', 'block']:
+        s = SocialNetwork(n=5, selfloops=False, weight_dist='uniform', dimensions='continuous', update_order=order)
+        s.prop(update_method='wt. avg.')
+        before = s.states.copy()
+        s.update()
+        if not np.array_equal(s.states, before):
+            return False
+    return True
+
+def test_6_39():
+    # Make sure the per-node path draws each node's influencers only once per update.
+    s = SocialNetwork(n=20, topology='random', saturation=.3, dimensions='continuous', update_method='majority',
+                      num_influencers=3, seed=7)
+    calls = []
+    draw = s.get_influencers
+    s.get_influencers = lambda u: calls.append(u) or draw(u)
+    s.update()
+    return sorted(calls) == sorted(s.nodes())
+
+def test_6_40():
+    # Make sure batched influencer sampling picks every neighbor equally often.
+    s = SocialNetwork(n=6, topology='complete', selfloops=False, num_influencers=2, seed=12)
+    counts = np.zeros(6)
+    for _ in range(3000):
+        rows, cols, _ = s._influence_edges([0], sample=True)
+        counts += np.bincount(cols, minlength=6)
+    return counts[0] == 0 and abs(counts[1:] / 6000 - .2).max() < .03
+
+def test_6_41():
+    # Make sure isolated nodes keep their states under the voting rules, in every update order.
+    for upd in ['majority', 'plurality']:
+        for order in ['sync', 'async', 'block']:
+            s = SocialNetwork(n=5, selfloops=False, update_order=order)
+            s.prop(update_method=upd)
+            before = s.states.copy()
+            s.update()
+            if not np.array_equal(s.states, before):
+                return False
+    return True
+
+def test_6_42():
+    # Make sure continuous-time updates ignore p_update and num_nodes_update and draw nothing for them.
+    runs = []
+    for kwargs in [{}, {'p_update': .3, 'num_nodes_update': 2}, {'p_update': 0.}]:
+        s = SocialNetwork(n=6, topology='cycle', dimensions='categorical', category_dist={'S': 1.}, selfloops=False,
+                          transmission_probs={'S': {'contact': {'I': ('I', .5)}}, 'I': {'auto': {'R': .5}}, 'R': {}},
+                          update_method='transmission', timing='continuous', seed=3, **kwargs)
+        s.set_state(0, ['I'])
+        s.update()
+        runs.append((s.clock, s.states.tolist()))
+    return runs[0] == runs[1] == runs[2] and runs[0][0] == 1.
+
+# The 7 run of tests is for ensuring that the cached adjacency snapshot is working correctly.
+
+def test_7_00():
+    # Make sure connect() and disconnect() bump the topology version.
+    s = SocialNetwork(n=3)
+    v0 = s.topology_version
+    s.connect(0, 1)
+    v1 = s.topology_version
+    s.disconnect(0, 1)
+    return v0 < v1 < s.topology_version
+
+def test_7_01():
+    # Make sure the snapshot is reused while the topology does not change.
+    s = SocialNetwork(n=10, topology='random', saturation=.3)
+    a = s.get_adjacency()
+    s.update()
+    return s.get_adjacency() is a
+
+def test_7_02():
+    # Make sure the snapshot is rebuilt after the topology changes.
+    s = SocialNetwork(n=3, selfloops=False)
+    a = s.get_adjacency()
+    s.connect(0, 2)
+    b = s.get_adjacency()
+    return a.nnz == 0 and b is not a and b[0, 2] == 1 and b[2, 0] == 1 and b.nnz == 2
+
+def test_7_03():
+    # Make sure the inbound snapshot lists predecessors in asymmetric DiGraph.
+    s = SocialNetwork(n=4, directed=True, symmetric=False, selfloops=False)
+    s.connect(1, 0)
+    s.connect(2, 0)
+    s.connect(0, 3)
+    csc = s.get_adjacency(inbound=True)
+    preds = sorted(s.node_list[i] for i in csc.indices[csc.indptr[0]:csc.indptr[1]])
+    return preds == sorted(s.predecessors(0))
+
+def test_7_04():
+    # Make sure parallel edges are collapsed in MultiGraph.
+    s = SocialNetwork(n=2, multiedge=True, selfloops=False)
+    s.connect(0, 1, 'a')
+    s.connect(0, 1, 'b')
+    a = s.get_adjacency()
+    return a.nnz == 2 and a[0, 1] == 1
+
+def test_7_05():
+    # Make sure the mask slots of the snapshot match the views they belong to.
+    s = SocialNetwork(n=10, topology='random', saturation=.4, num_dimensions=3, visibility='random')
+    csc = s.get_adjacency(inbound=True)
+    slots = s.get_influence_slots()
+    for j in range(csc.shape[1]):
+        for p in range(csc.indptr[j], csc.indptr[j + 1]):
+            viewer, target = s.node_list[j], s.node_list[csc.indices[p]]
+            if s.mask_store.gather(slots[p]).astype(int).tolist() != s.prop('masks')[viewer][target]:
+                return False
+    return True
+
+def test_7_06():
+    # Make sure the influence slots line up with the masks after edges are added and removed in DiGraph.
+    s = SocialNetwork(n=30, topology='random', saturation=.2, directed=True, symmetric=False, seed=10)
+    for _ in range(40):
+        u, v = rnd.randrange(30), rnd.randrange(30)
+        if v in s[u] and u != v:
+            s.disconnect(u, v)
+        else:
+            s.connect(u, v)
+    csc = s.get_adjacency(inbound=True)
+    slots = s.get_influence_slots()
+    for j in range(30):
+        viewer = s.mask_store.slots.get(s.node_list[j], {})
+        for p in range(csc.indptr[j], csc.indptr[j + 1]):
+            if slots[p] != viewer.get(s.node_list[csc.indices[p]], -1):
+                return False
+    return True
+
+# The 8 run of tests is for ensuring that batched reward calculations agree with reward().
+
+REWARD_MODELS = {'default': {'homophily': 'homophilic', 'conformity': 'conforming', 'max_sim': 1.},
+                 'het': {'homophily': 'heterophilic', 'conformity': 'conforming', 'max_sim': 0.},
+                 'meso': {'homophily': 'mesophilic', 'conformity': 'conforming', 'max_sim': .4}}
+
+def reward_pairs_match(s, raw=False):
+    us, vs = zip(*[(u, v) for u in s for v in s])
+    ref = np.array([s.reward(u, v, raw=raw) for u, v in zip(us, vs)], dtype=float)
+    return np.allclose(ref, s.reward_many(us, vs, raw=raw), equal_nan=True)
+
+def test_8_00():
+    # Make sure batched masked hamming rewards match reward().
+    s = SocialNetwork(n=12, topology='random', saturation=.4, num_dimensions=4, visibility='random',
+                      distance='hamming', agent_models=REWARD_MODELS)
+    return reward_pairs_match(s)
+
+def test_8_01():
+    # Make sure batched raw euclidean rewards match reward() with continuous dimensions and mixed agent types.
+    s = SocialNetwork(n=12, topology='random', saturation=.4, num_dimensions=3, dimensions='continuous',
+                      initialize_at_extremes=False, distance='euclidean', agent_models=REWARD_MODELS,
+                      type_dist={'default': .4, 'het': .3, 'meso': .3})
+    return reward_pairs_match(s, raw=True)
+
+def test_8_02():
+    # Make sure batched masked cosine rewards match reward() in asymmetric DiGraph.
+    s = SocialNetwork(n=12, topology='random', saturation=.4, num_dimensions=3, dimensions='continuous',
+                      initialize_at_extremes=False, distance='cosine', agent_models=REWARD_MODELS, directed=True,
+                      symmetric=False, visibility='random', type_dist={'default': .4, 'het': .3, 'meso': .3})
+    return reward_pairs_match(s)
+
+def test_8_03():
+    # Make sure batched rewards are the same whether or not the adjacency snapshot is current.
+    s = SocialNetwork(n=12, topology='random', saturation=.4, num_dimensions=4, visibility='random',
+                      distance='hamming', agent_models=REWARD_MODELS)
+    s.connect(0, 1)
+    before = s.reward_many(0, list(s.nodes()))
+    s.get_adjacency()
+    return list(before) == list(s.reward_many(0, list(s.nodes())))
+
+def test_8_04():
+    # Make sure unconnected nodes see nothing of each other.
+    s = SocialNetwork(n=3, num_dimensions=2, distance='hamming', agent_models=REWARD_MODELS)
+    s.set_state(0, [1, 1])
+    s.set_state(1, [-1, -1])
+    return list(s.reward_many(0, [1])) == [1.] and list(s.reward_many(0, [1], raw=True)) == [0.]
+
+# The 9 run of tests is for ensuring that the connection candidate search agrees with scoring every node.
+
+def connection_candidates_match(s):
+    for u in s:
+        ref = sorted(s.node_index[i] for i in s if i not in s[u] and i != u
+                     and s.reward(u, i) >= s.prop('thresh_connect'))
+        if s.get_connection_candidates(u).tolist() != ref:
+            return False
+    return True
+
+def test_9_00():
+    # Make sure connection candidates match the exhaustive scan with the default threshold.
+    s = SocialNetwork(n=15, topology='random', saturation=.3, num_dimensions=3, distance='hamming',
+                      agent_models=REWARD_MODELS)
+    return connection_candidates_match(s)
+
+def test_9_01():
+    # Make sure connection candidates match the exhaustive scan with a threshold and mixed agent types.
+    s = SocialNetwork(n=15, topology='random', saturation=.3, num_dimensions=3, distance='euclidean',
+                      dimensions='continuous', initialize_at_extremes=False, agent_models=REWARD_MODELS,
+                      type_dist={'default': .4, 'het': .3, 'meso': .3}, thresh_connect=.5)
+    return connection_candidates_match(s)
+
+def test_9_02():
+    # Make sure predecessors are scored on what they show in asymmetric DiGraph.
+    s = SocialNetwork(n=15, topology='random', saturation=.4, num_dimensions=3, distance='hamming', directed=True,
+                      symmetric=False, visibility='random', agent_models=REWARD_MODELS,
+                      type_dist={'default': .4, 'het': .3, 'meso': .3}, thresh_connect=.5)
+    return connection_candidates_match(s)
+
+def test_9_03():
+    # Make sure nodes never become their own or an existing neighbor's candidate.
+    s = SocialNetwork(n=10, topology='complete', agent_models=REWARD_MODELS, distance='hamming')
+    return all(len(s.get_connection_candidates(u)) == 0 for u in s)
+
+def test_9_04():
+    # Make sure get_connections only proposes candidates.
+    s = SocialNetwork(n=15, topology='random', saturation=.2, num_dimensions=3, distance='hamming',
+                      agent_models=REWARD_MODELS, thresh_connect=.5, p_connect=1., num_nodes_connect=15,
+                      type_dist={'default': .5, 'het': .5})
+    before = {u: set(s.node_list[i] for i in s.get_connection_candidates(u)) for u in s}
+    return all(v in before[u] or u in before[v] for u, v in [e[:2] for e in s.get_connections()])
+
+def test_9_05():
+    # Make sure get_disconnections only drops low-reward ties, and at most num_disconnections per node.
+    s = SocialNetwork(n=20, topology='random', saturation=.4, num_dimensions=3, distance='hamming', directed=True,
+                      agent_models=REWARD_MODELS, thresh_disconnect=.5, p_disconnect=1., num_disconnections=2,
+                      num_nodes_disconnect=20, type_dist={'default': .5, 'het': .5}, selfloops=False,
+                      symmetric=False)
+    rewards = {(u, v): s.reward(u, v, raw=True) for u, v in s.edges()}
+    removed = [e[:2] for e in s.get_disconnections()]
+    counts = {}
+    for u, v in removed:
+        counts[u] = counts.get(u, 0) + 1
+    return len(removed) > 0 and all(rewards[e] < .5 for e in removed) and max(counts.values()) <= 2 and \
+        not any(s.has_edge(u, v) for u, v in removed)
+
+def test_9_06():
+    # Make sure 'two_hop' candidates are exactly the 'all' candidates among the neighbors of neighbors.
+    s = SocialNetwork(n=30, topology='random', saturation=.1, num_dimensions=3, distance='hamming',
+                      agent_models=REWARD_MODELS, thresh_connect=.5, type_dist={'default': .5, 'het': .5}, seed=4)
+    full = {u: set(s.get_connection_candidates(u)) for u in s}
+    s.prop(connect_candidates='two_hop')
+    for u in s:
+        hops = {s.node_index[w] for v in s[u] for w in s[v]}
+        if set(s.get_connection_candidates(u)) != full[u] & hops:
+            return False
+    return True
+
+def test_9_07():
+    # Make sure 'mixed' candidates keep every 'two_hop' candidate and never propose anything 'all' would not.
+    s = SocialNetwork(n=40, topology='random', saturation=.1, num_dimensions=3, distance='hamming',
+                      agent_models=REWARD_MODELS, thresh_connect=.5, type_dist={'default': .5, 'het': .5}, seed=6)
+    full = {u: set(s.get_connection_candidates(u)) for u in s}
+    s.prop(connect_candidates='two_hop')
+    local = {u: set(s.get_connection_candidates(u)) for u in s}
+    s.prop(connect_candidates='mixed', global_candidates=1.)
+    mixed = {u: set(s.get_connection_candidates(u)) for u in s}
+    return all(local[u] <= mixed[u] <= full[u] for u in s) and any(mixed[u] != local[u] for u in s)
+
+def test_9_08():
+    # Make sure 'two_hop' only offers the nodes that would close a triad along a path.
+    s = SocialNetwork(n=6, topology='-', selfloops=False, distance='hamming', agent_models=REWARD_MODELS,
+                      connect_candidates='two_hop')
+    s.connect_many([(0, 1), (1, 2), (2, 3), (3, 4)])
+    return [list(s.get_connection_candidates(u)) for u in s] == [[2], [3], [0, 4], [1], [2], []]
+
+def test_9_09():
+    # Make sure budgeted sampling only returns real candidates, at most as many as asked for, without repeats.
+    s = SocialNetwork(n=40, topology='random', saturation=.1, num_dimensions=3, distance='hamming',
+                      agent_models=REWARD_MODELS, thresh_connect=.5, type_dist={'default': .5, 'het': .5},
+                      connect_budget=4, seed=8)
+    for mode in ['all', 'two_hop']:
+        s.prop(connect_candidates=mode)
+        for u in s:
+            full = set(s.get_connection_candidates(u))
+            picks = list(s.sample_connection_candidates(u, 3))
+            if len(picks) > 3 or len(set(picks)) != len(picks) or not set(picks) <= full:
+                return False
+    return True
+
+def test_9_10():
+    # Make sure budgeted sampling finds a full set of candidates when nearly everyone qualifies.
+    s = SocialNetwork(n=200, topology='random', saturation=.02, distance='hamming', agent_models=REWARD_MODELS,
+                      thresh_connect=0., connect_budget=4, p_connect=1., num_connections=5, num_nodes_connect=10,
+                      selfloops=False, symmetric=False, directed=True, seed=9)
+    return all(len(s.sample_connection_candidates(u, 5)) == 5 for u in s) and len(s.get_connections()) == 50
+
+def test_9_11():
+    # Make sure mutual proposals in MultiGraph add one tie, not a pair of parallel edges.
+    s = SocialNetwork(n=6, topology='-', multiedge=True, selfloops=False, distance='hamming',
+                      agent_models=REWARD_MODELS, thresh_connect=0., p_connect=1., num_connections=5, seed=3)
+    added = s.get_connections()
+    return len(added) == 15 and s.number_of_edges() == 15 and \
+        all(s.number_of_edges(u, v) == 1 for u in s for v in s if u != v)
+
+def test_9_12():
+    # Make sure rewiring with nothing to propose changes nothing.
+    s = SocialNetwork(n=6, topology='complete', distance='hamming', agent_models=REWARD_MODELS, p_connect=1.,
+                      p_disconnect=1., thresh_disconnect=0.)
+    before = sorted(s.edges())
+    return s.get_connections() == [] and s.get_disconnections() == [] and sorted(s.edges()) == before
+
+def test_9_13():
+    # Make sure 'two_hop' candidates follow edge removals made since the last adjacency snapshot.
+    s = SocialNetwork(n=6, topology='-', selfloops=False, distance='hamming', agent_models=REWARD_MODELS,
+                      connect_candidates='two_hop')
+    s.connect_many([(0, 1), (1, 2), (2, 3), (3, 4)])
+    before = list(s.get_connection_candidates(0))
+    s.disconnect(1, 2)
+    return before == [2] and list(s.get_connection_candidates(0)) == [] and list(s.get_connection_candidates(1)) == []
+
+def test_9_14():
+    # Make sure connect_budget only accepts non-negative integers.
+    for val in [2.5, -1, True]:
+        try:
+            SocialNetwork(n=5, connect_budget=val)
+            return False
+        except InvalidPropertyError:
+            pass
+    return SocialNetwork(n=5, connect_budget=np.int64(3)).prop('connect_budget') == 3
+
+# The 10 run of tests is for ensuring that bulk edge changes agree with connect() and disconnect().
+
+def connect_many_matches(**kwargs):
+    a, b = SocialNetwork(**kwargs), SocialNetwork(**kwargs)
+    edges = [(0, 1), (2, 1), (1, 0), (3, 3), (0, 1), (4, 2)]
+    ra = [e for (u, v) in edges for e in a.connect(u, v)]
+    rb = b.connect_many(edges)
+    keys = {'keys': True} if kwargs.get('multiedge') else {}
+    return ra == rb and sorted(a.edges(data=True, **keys)) == sorted(b.edges(data=True, **keys)) and \
+        all(a.prop('masks')[u] == b.prop('masks')[u] for u in a) and \
+        a.prop('normalized_weights') == b.prop('normalized_weights')
+
+def test_10_00():
+    # Make sure connect_many() builds the same Graph as connect().
+    return connect_many_matches(n=5, topology='-', weight_dist='constant', weight_const=.5)
+
+def test_10_01():
+    # Make sure connect_many() builds the same symmetric DiGraph as connect().
+    return connect_many_matches(n=5, topology='-', directed=True, symmetric=True, visibility='visible',
+                                weight_dist='constant', weight_const=.5)
+
+def test_10_02():
+    # Make sure connect_many() labels symmetric MultiDiGraph edges the same way connect() does.
+    return connect_many_matches(n=5, topology='-', directed=True, symmetric=True, multiedge=True,
+                                weight_dist='constant', weight_const=.5)
+
+def test_10_03():
+    # Make sure connect_many() skips selfloops when those are not allowed, and adds nothing with p = 0.
+    s = SocialNetwork(n=5, topology='-', selfloops=False)
+    return s.connect_many([(1, 1), (0, 1)]) == [(0, 1)] and s.connect_many([(2, 3)], p=0.) == [] and \
+        s.number_of_edges() == 1
+
+def test_10_04():
+    # Make sure bulk-generated uniform weights stay within bounds.
+    s = SocialNetwork(n=30, topology='random', saturation=.3, weight_dist='uniform', weight_min=.2, weight_max=.4)
+    return all(.2 <= w <= .4 for _, _, w in s.edges(data='weight'))
+
+def disconnect_many_matches(**kwargs):
+    a, b = SocialNetwork(**kwargs), SocialNetwork(**kwargs)
+    a.connect(0, 1)
+    b.connect(0, 1)
+    edges = [(0, 1), (1, 2), (3, 4), (0, 4)]
+    ra = [e for (u, v) in edges for e in a.disconnect(u, v)]
+    rb = b.disconnect_many(edges)
+    keys = {'keys': True} if kwargs.get('multiedge') else {}
+    return ra == rb and sorted(a.edges(data=True, **keys)) == sorted(b.edges(data=True, **keys)) and \
+        all(a.prop('masks')[u] == b.prop('masks')[u] for u in a) and \
+        a.prop('normalized_weights') == b.prop('normalized_weights')
+
+def test_10_05():
+    # Make sure disconnect_many() leaves the same Graph as disconnect().
+    return disconnect_many_matches(n=5, topology='complete', weight_dist='constant', weight_const=.5)
+
+def test_10_06():
+    # Make sure disconnect_many() leaves the same symmetric DiGraph as disconnect().
+    return disconnect_many_matches(n=5, topology='complete', directed=True, symmetric=True, visibility='visible',
+                                   weight_dist='constant', weight_const=.5)
+
+def test_10_07():
+    # Make sure disconnect_many() removes every parallel edge of a MultiDiGraph pair, as disconnect() does.
+    return disconnect_many_matches(n=5, topology='complete', directed=True, multiedge=True, symmetric=False,
+                                   weight_dist='constant', weight_const=.5)
+
+def test_10_08():
+    # Make sure disconnect_many() skips kept selfloops, repeated edges and edges that do not exist.
+    s = SocialNetwork(n=5, topology='-', selfloops=True)
+    s.connect_many([(0, 1), (2, 3)])
+    return s.disconnect_many([(1, 1), (1, 0), (0, 1), (3, 4)]) == [(0, 1)] and \
+        s.disconnect_many([(2, 3)], p=0.) == [] and s.has_edge(1, 1) and s.has_edge(2, 3)
+
 def testsuite():
     global PASSCOUNT, TESTCOUNT, FAILTESTS
 
@@ -2096,6 +3037,13 @@ def testsuite():
     unittest(test_1_24())
     unittest(test_1_25())
     unittest(test_1_26())
+    unittest(test_1_27())
+    unittest(test_1_28())
+    unittest(test_1_29())
+    unittest(test_1_30())
+    unittest(test_1_31())
+    unittest(test_1_32())
+    unittest(test_1_33())
 
     # test_2_*
     unittest(test_2_00())
@@ -2154,6 +3102,11 @@ def testsuite():
     unittest(test_2_53())
     unittest(test_2_54())
     unittest(test_2_55())
+    unittest(test_2_56())
+    unittest(test_2_57())
+    unittest(test_2_58())
+    unittest(test_2_59())
+    unittest(test_2_60())
 
     # test_3_*
     unittest(test_3_00())
@@ -2296,6 +3249,109 @@ def testsuite():
     unittest(test_4_89())
     unittest(test_4_90())
     unittest(test_4_91())
+    unittest(test_4_92())
+    unittest(test_4_93())
+    unittest(test_4_94())
+    unittest(test_4_95())
+    unittest(test_4_96())
+
+    # test_5_*
+    unittest(test_5_00())
+    unittest(test_5_01())
+    unittest(test_5_02())
+    unittest(test_5_03())
+    unittest(test_5_04())
+    unittest(test_5_05())
+    unittest(test_5_06())
+
+    # test_6_*
+    unittest(test_6_00())
+    unittest(test_6_01())
+    unittest(test_6_02())
+    unittest(test_6_03())
+    unittest(test_6_04())
+    unittest(test_6_05())
+    unittest(test_6_06())
+    unittest(test_6_07())
+    unittest(test_6_08())
+    unittest(test_6_09())
+    unittest(test_6_10())
+    unittest(test_6_11())
+    unittest(test_6_12())
+    unittest(test_6_13())
+    unittest(test_6_14())
+    unittest(test_6_15())
+    unittest(test_6_16())
+    unittest(test_6_17())
+    unittest(test_6_18())
+    unittest(test_6_19())
+    unittest(test_6_20())
+    unittest(test_6_21())
+    unittest(test_6_22())
+    unittest(test_6_23())
+    unittest(test_6_24())
+    unittest(test_6_25())
+    unittest(test_6_26())
+    unittest(test_6_27())
+    unittest(test_6_28())
+    unittest(test_6_29())
+    unittest(test_6_30())
+    unittest(test_6_31())
+    unittest(test_6_32())
+    unittest(test_6_33())
+    unittest(test_6_34())
+    unittest(test_6_35())
+    unittest(test_6_36())
+    unittest(test_6_37())
+    unittest(test_6_38())
+    unittest(test_6_39())
+    unittest(test_6_40())
+    unittest(test_6_41())
+    unittest(test_6_42())
+
+    # test_7_*
+    unittest(test_7_00())
+    unittest(test_7_01())
+    unittest(test_7_02())
+    unittest(test_7_03())
+    unittest(test_7_04())
+    unittest(test_7_05())
+    unittest(test_7_06())
+
+    # test_8_*
+    unittest(test_8_00())
+    unittest(test_8_01())
+    unittest(test_8_02())
+    unittest(test_8_03())
+    unittest(test_8_04())
+
+    # test_9_*
+    unittest(test_9_00())
+    unittest(test_9_01())
+    unittest(test_9_02())
+    unittest(test_9_03())
+    unittest(test_9_04())
+    unittest(test_9_05())
+    unittest(test_9_06())
+    unittest(test_9_07())
+    unittest(test_9_08())
+    unittest(test_9_09())
+    unittest(test_9_10())
+    unittest(test_9_11())
+    unittest(test_9_12())
+    unittest(test_9_13())
+    unittest(test_9_14())
+
+    # test_10_*
+    unittest(test_10_00())
+    unittest(test_10_01())
+    unittest(test_10_02())
+    unittest(test_10_03())
+    unittest(test_10_04())
+    unittest(test_10_05())
+    unittest(test_10_06())
+    unittest(test_10_07())
+    unittest(test_10_08())
 
 
     # print message